@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Height functions and arctic boundaries of domino tilings
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+All functions here work on tilings in the array form of `aztec_array.py`
+(use `AztecDiamondArray.from_dict` to convert an `AztecDiamond`) and cost
+O(n^2) whole-array operations, much less than sampling the tiling.
+
+Thurston's height function is defined on the vertices of the cells.
+Walk along an edge of a cell with a black cell on the left, the height
+increases by 1 if the edge lies on the boundary of a domino and
+decreases by 3 if it cuts a domino into halves; with a black cell on
+the right the signs are reversed. The height of the vertex (x, y) is
+returned in the item (x+n, y+n) of a (2n+1) x (2n+1) array, normalized
+so that the bottom vertex (0, -n) has height 0. Heights are computed
+by cumulative sums: first up the column x = 0, then along the rows.
+
+The frozen regions are the four brick-wall regions at the corners of
+the diamond: the dominoes of type 'w' (resp. 'e') reached from the
+left (resp. right) end of a row without passing any other type, and
+the dominoes of type 'n' (resp. 's') reached from the top (resp. bottom)
+end of a column. The rest of the diamond is the temperate region and
+its outline is the arctic boundary.
+
+:copyright (c) 2015 by Zhao Liang.
+"""
+import numpy as np
+from aztec_array import EMPTY, N, S, W, E, LEFT, DOWN, black_parity, partner_sides
+
+
+def vertices_inside(n):
+    """Return a boolean array that marks the vertices of the cells in the diamond."""
+    x = np.abs(np.arange(-n, n + 1))
+    return x[:, None] + x[None, :] <= n + 1
+
+
+def height_function(tile, n):
+    """
+    Return the height function of a complete tiling `tile` of order n, a float
+    array of shape (2n+1, 2n+1) whose items outside the diamond are NaN.
+    """
+    # pad the tiling with a ring of empty cells, the cell (i, j) is at (i+n+1, j+n+1).
+    padded = np.zeros((2*n + 2, 2*n + 2), dtype=np.int8)
+    padded[1:-1, 1:-1] = tile
+    sides = partner_sides(padded, n)
+    sign = np.where(black_parity(padded.shape, n), 1, -1)
+
+    # the edge from (x, y) to (x, y+1) has the cell (x-1, y) on the left
+    # and it cuts a domino if the cell (x, y) has its other half on the left.
+    dv = np.where(sides[1:, 1:-1] == LEFT, -3, 1) * sign[:-1, 1:-1]
+    # the edge from (x, y) to (x+1, y) has the cell (x, y) on the left
+    # and it cuts a domino if this cell has its other half below.
+    dh = np.where(sides[1:-1, 1:] == DOWN, -3, 1) * sign[1:-1, 1:]
+
+    height = np.zeros((2*n + 1, 2*n + 1), dtype=float)
+    height[n, 1:] = np.cumsum(dv[n])
+    height[n+1:] = height[n] + np.cumsum(dh[n:], axis=0)
+    height[:n] = height[n] - np.cumsum(dh[n-1::-1], axis=0)[::-1]
+    height[~vertices_inside(n)] = np.nan
+    return height
+
+
+def runs(mask, axis):
+    """
+    Return a boolean array that marks the items of `mask` reached from the
+    beginning of `axis` through True items only, i.e. the leading runs of True.
+    """
+    return np.logical_and.accumulate(mask, axis=axis)
+
+
+def frozen_cells(tile, n):
+    """
+    Return an uint8 array of the same shape as `tile` whose items are the types
+    of the frozen regions the cells belong to, or `EMPTY` for the temperate cells
+    and the cells outside the diamond.
+    """
+    frozen = np.zeros(tile.shape, dtype=np.uint8)
+    # each row (column) of the diamond is surrounded by empty cells, skip them first.
+    outside = runs(tile == EMPTY, 0)
+    west = runs((tile == W) | outside, 0) & (tile == W)
+    outside = runs(tile[::-1] == EMPTY, 0)
+    east = (runs((tile[::-1] == E) | outside, 0) & (tile[::-1] == E))[::-1]
+    outside = runs(tile[:, ::-1] == EMPTY, 1)
+    north = (runs((tile[:, ::-1] == N) | outside, 1) & (tile[:, ::-1] == N))[:, ::-1]
+    outside = runs(tile == EMPTY, 1)
+    south = runs((tile == S) | outside, 1) & (tile == S)
+    for t, region in ((N, north), (S, south), (W, west), (E, east)):
+        frozen[region] = t
+    return frozen
+
+
+def temperate_boundary(temperate, n):
+    """
+    Return the outline of the cells marked by the boolean array `temperate`
+    as a closed polyline, an array of shape (m, 2) of points (x, y).
+    For each row of cells the outline passes the left side of the leftmost
+    marked cell and the right side of the rightmost one.
+    """
+    rows = np.flatnonzero(temperate.any(axis=0))
+    cols = temperate[:, rows]
+    left = np.argmax(cols, axis=0) - n
+    right = 2*n - np.argmax(cols[::-1], axis=0) - n
+    y = rows - n + 0.5
+    points = np.concatenate([np.column_stack([left, y]),
+                             np.column_stack([right, y])[::-1]])
+    return points.astype(float)
+
+
+def arctic_boundary(tile, n):
+    """Return the arctic boundary of a complete tiling of order n, see `temperate_boundary`."""
+    temperate = (frozen_cells(tile, n) == EMPTY) & (tile != EMPTY)
+    return temperate_boundary(temperate, n)
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Domino Shuffling on Aztec Diamonds with NumPy Arrays
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This is the same algorithm as in `aztec.py`, but the tiling is stored
+in a 2d int8 array and the three steps `delete`, `slide`, `create`
+are whole-array operations, so it can sample tilings of order in the
+thousands.
+
+The two representations can be converted to each other with
+`AztecDiamondArray.from_dict` and `AztecDiamondArray.to_dict`.
+
+A complete tiling can also be stored in a compact form: each domino
+covers exactly one black cell, so the type of the black cells (2 bits
+each) determines the tiling. An order-n tiling takes n(n+1)/4 bytes,
+see `AztecDiamondArray.pack` and the functions `save` and `load`.
+
+Edge-weighted Aztec diamonds are sampled by passing the precomputed
+creation probabilities of `edge_probability.creation_rates` as `rates`,
+the `create` step then compares uniform random numbers against them.
+
+Long runs can be checkpointed with `save_checkpoint`, the file holds the
+packed tiling and the state of the random generator, so a run resumed by
+`load_checkpoint` gives exactly the same tiling as an uninterrupted run.
+"""
+import os
+import struct
+import numpy as np
+from aztec import AztecDiamond
+
+
+# integer codes of the cell types, 0 means an empty cell.
+EMPTY, N, S, W, E = range(5)
+TYPES = [None, 'n', 's', 'w', 'e']
+CODES = {t: c for c, t in enumerate(TYPES)}
+
+# the sides of a cell, 0 means no side. "up" is the direction of increasing j.
+NONE, LEFT, RIGHT, DOWN, UP = range(5)
+
+# SIDES[t, black] is the side of the other half of the domino of type t
+# covering a black (black=1) or white (black=0) cell.
+SIDES = np.array([[NONE, NONE],
+                  [RIGHT, LEFT],  # 'n': the black cell is the right half.
+                  [LEFT, RIGHT],  # 's': the black cell is the left half.
+                  [DOWN, UP],     # 'w': the black cell is the bottom half.
+                  [UP, DOWN]],    # 'e': the black cell is the top half.
+                 dtype=np.uint8)
+
+# header of the files written by `save`: a magic string and the order.
+MAGIC = b'AZTEC2BT'
+HEADER = struct.Struct('<8sQ')
+
+
+class AztecDiamondArray(object):
+    """
+    Use a 2d array to represent a tiling of an Aztec diamond graph.
+    The cell (i, j) of an Aztec diamond of order n is stored in
+    `tile[i+n, j+n]`, its value is the code of its type in `TYPES`.
+    Cells outside the diamond are always empty.
+
+    `tile` is a view of the center of one of two preallocated buffers
+    that are large enough for an Aztec diamond of order `capacity`.
+    The `slide` step writes the new tiling into the other buffer and
+    then swaps them, so the algorithm runs in place without allocating
+    a new board for each step. Only the region covered by the current
+    diamond is touched in each step.
+    """
+
+    def __init__(self, n, rng=None, capacity=None, rates=None):
+        """
+        Create an Aztec diamond graph of order n with an empty tiling.
+        `rng` is an instance of `numpy.random.RandomState` used in the `create` step,
+        the global random state of numpy is used if it's None.
+        `capacity` is the max order the buffers can hold, set it to the final
+        order of the algorithm to avoid reallocating the buffers. The buffers
+        are doubled if the diamond grows beyond the capacity.
+        `rates` is the output of `edge_probability.creation_rates` for sampling
+        an edge-weighted Aztec diamond, None means the uniform measure.
+        """
+        self.order = n
+        self.rng = np.random if rng is None else rng
+        self.rates = rates
+        self.capacity = max(n, capacity or 0)
+        self._buffers = [np.zeros((2*self.capacity, 2*self.capacity), dtype=np.int8)
+                         for _ in range(2)]
+        self.tile = self.active_region(self._buffers[0], n)
+
+    def active_region(self, buf, n):
+        """Return the view of `buf` that holds an Aztec diamond of order n."""
+        c = self.capacity
+        return buf[c-n: c+n, c-n: c+n]
+
+    def reserve(self, capacity):
+        """Reallocate the buffers so that they can hold an Aztec diamond of order `capacity`."""
+        tile = self.tile
+        self.capacity = capacity
+        self._buffers = [np.zeros((2*capacity, 2*capacity), dtype=np.int8)
+                         for _ in range(2)]
+        self.tile = self.active_region(self._buffers[0], self.order)
+        self.tile[...] = tile
+
+    def cells_inside(self):
+        """Return a boolean array that marks the cells in the diamond."""
+        n = self.order
+        x = np.abs(2 * np.arange(-n, n, dtype=np.int32) + 1)
+        return x[None, :] <= (2 * n - x)[:, None]
+
+    def black_cells(self):
+        """Return a boolean array that marks the black cells, see `AztecDiamond.is_black`."""
+        # cell (i, j) is at index (i+n, j+n) hence i+j+n = a+b-n.
+        return black_parity(self.tile.shape, self.order)
+
+    def random_bits(self, shape):
+        """Return a boolean array of independent fair coins."""
+        size = int(np.prod(shape))
+        data = np.frombuffer(self.rng.bytes((size + 7) // 8), dtype=np.uint8)
+        return np.unpackbits(data)[:size].reshape(shape).view(bool)
+
+    @staticmethod
+    def blocks(tile):
+        """
+        Return four views of `tile` that are the bottom-left, bottom-right,
+        top-left and top-right cells of all 2x2 blocks, in the same order
+        as `AztecDiamond.block`.
+        """
+        return tile[:-1, :-1], tile[1:, :-1], tile[:-1, 1:], tile[1:, 1:]
+
+    def delete(self):
+        """
+        Delete all bad blocks in a tiling.
+        A block is called bad if it contains a pair of parallel dominoes that
+        have orientations toward each other. The bad blocks never overlap,
+        so they can be found all at once.
+        """
+        bl, br, tl, tr = self.blocks(self.tile)
+        bad = (((bl == N) & (br == N) & (tl == S) & (tr == S))
+               | ((bl == E) & (br == W) & (tl == E) & (tr == W)))
+        keep = ~bad
+        for cell in (bl, br, tl, tr):
+            cell *= keep
+        return self
+
+    def slide(self):
+        """
+        Move all dominoes one step according to their orientations.
+        Note this step modifies the board in place and returns itself.
+        """
+        if self.order + 1 > self.capacity:
+            self.reserve(max(2 * self.capacity, 1))
+
+        spare = self._buffers[1]
+        t = self.tile
+        new = self.active_region(spare, self.order + 1)
+        new.fill(EMPTY)
+        # the cell (i, j) in `t` is at (i+1, j+1) in `new`.
+        # each cell receives at most one domino, so the moves can be added up.
+        # (multiplying by boolean masks is much faster than masked assignment.)
+        new[1:-1, 2:] += (t == N) * np.int8(N)
+        new[1:-1, :-2] += (t == S) * np.int8(S)
+        new[:-2, 1:-1] += (t == W) * np.int8(W)
+        new[2:, 1:-1] += (t == E) * np.int8(E)
+
+        self._buffers.reverse()
+        self.order += 1
+        self.tile = new
+        return self
+
+    def create(self):
+        """
+        Fill all holes with pairs of dominoes that leaving each other.
+
+        The holes form disjoint 2x2 blocks whose bottom-left cells are black,
+        but a 2x2 square of empty cells is not necessarily one of them
+        (think of a 4x4 square of holes). The bottom-left cell of a candidate
+        block at (i, j) can only be covered by the block itself or by the
+        candidate at (i-1, j-1), so along each diagonal the candidates are
+        accepted and rejected alternately, starting from the lowest one.
+        This gives the same blocks as scanning the cells from the bottom row
+        up as in `AztecDiamond.create`.
+        """
+        empty = (self.tile == EMPTY) & self.cells_inside()
+        bl, br, tl, tr = self.blocks(empty)
+        candidate = bl & br & tl & tr & self.black_cells()[:-1, :-1]
+
+        # the candidates whose lower-left neighbour is also a candidate are rare,
+        # resolve them by walking down their diagonals.
+        corner = candidate.copy()
+        x, y = np.divmod(np.flatnonzero(candidate[1:, 1:] & candidate[:-1, :-1]),
+                         candidate.shape[1] - 1)
+        steps = np.ones_like(x)
+        active = np.arange(len(x))
+        while len(active) > 0:
+            i, j = x[active] - steps[active], y[active] - steps[active]
+            more = (i >= 0) & (j >= 0)
+            more[more] = candidate[i[more], j[more]]
+            active = active[more]
+            steps[active] += 1
+        corner[x[steps % 2 == 1] + 1, y[steps % 2 == 1] + 1] = False
+
+        # 0 means no block, 1 means horizontal dominoes and 2 means vertical dominoes.
+        if self.rates is None:
+            # flip a fair coin for each block.
+            choice = corner.view(np.int8) << self.random_bits(corner.shape).view(np.int8)
+        else:
+            # the block (I, J) of `rates` has its bottom-left cell at (I+J, J-I+k-1).
+            choice = corner.astype(np.int8)
+            x, y = np.nonzero(corner)
+            k = self.order
+            rates = self.rates[k][(x - y + k - 1) // 2, (x + y - k + 1) // 2]
+            choice[x, y] += self.rng.random_sample(len(x)) < rates
+        for cell, h, v in zip(self.blocks(self.tile), (S, S, N, N), (W, E, W, E)):
+            cell += np.take(np.array([EMPTY, h, v], dtype=np.int8), choice)
+        return self
+
+    @classmethod
+    def from_dict(cls, az, rng=None, capacity=None, rates=None):
+        """Convert an instance of the `AztecDiamond` class."""
+        n = az.order
+        board = cls(n, rng, capacity, rates)
+        for (i, j), t in az.tile.items():
+            board.tile[i+n, j+n] = CODES[t]
+        return board
+
+    def to_dict(self):
+        """Convert to an instance of the `AztecDiamond` class, e.g. for rendering."""
+        n = self.order
+        az = AztecDiamond(n)
+        for (i, j) in az.cells:
+            az.tile[(i, j)] = TYPES[self.tile[i+n, j+n]]
+        return az
+
+    def pack(self):
+        """
+        Pack a complete tiling into a uint8 array with 2 bits per black cell.
+        The black cells are listed in the order of `tile[cells_inside() & black_cells()]`,
+        every 4 of them are packed into one byte, low bits first.
+        """
+        black = self.cells_inside() & self.black_cells()
+        codes = self.tile[black].astype(np.uint8)
+        if not codes.all():
+            raise ValueError('Only a complete tiling can be packed!')
+        codes -= 1
+        codes = np.concatenate([codes, np.zeros(-len(codes) % 4, dtype=np.uint8)])
+        codes = codes.reshape(-1, 4) << np.array([0, 2, 4, 6], dtype=np.uint8)
+        return np.bitwise_or.reduce(codes, axis=1)
+
+    @classmethod
+    def unpack(cls, n, data, rng=None, capacity=None, rates=None):
+        """Rebuild an Aztec diamond of order n from the output of `pack`."""
+        board = cls(n, rng, capacity, rates)
+        black = board.cells_inside() & board.black_cells()
+        count = n * (n + 1)
+        data = np.asarray(data, dtype=np.uint8)
+        if len(data) != (count + 3) // 4:
+            raise ValueError('Packed data does not match an Aztec diamond of order {}'.format(n))
+
+        codes = (data[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+        t = board.tile
+        t[black] = codes.ravel()[:count] + 1
+        # the white cell of each domino is next to its black cell.
+        b = t * black
+        t[:-1, :] += (b[1:, :] == N) * np.int8(N)
+        t[1:, :] += (b[:-1, :] == S) * np.int8(S)
+        t[:, 1:] += (b[:, :-1] == W) * np.int8(W)
+        t[:, :-1] += (b[:, 1:] == E) * np.int8(E)
+        return board
+
+
+def black_parity(shape, n):
+    """
+    Return a boolean array of the given shape that marks the black cells,
+    where the item at (a, b) is the cell (a-n, b-n).
+    """
+    px = np.arange(shape[0]) % 2 == 1
+    py = np.arange(shape[1]) % 2 == 1
+    return (px[:, None] ^ py[None, :]) != (n % 2 == 1)
+
+
+def partner_sides(tile, n):
+    """
+    Return an uint8 array of the same shape as the tiling `tile` of order n,
+    its items are the sides (in `LEFT`, `RIGHT`, `DOWN`, `UP`) of the cells
+    where the other halves of the dominoes lie, `NONE` for empty cells.
+    """
+    return SIDES[tile, black_parity(tile.shape, n).view(np.uint8)]
+
+
+def save(board, filename):
+    """Save a complete tiling to a binary file in the packed form."""
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, board.order))
+        f.write(board.pack().tobytes())
+
+
+def load(filename, mmap=True):
+    """
+    Read a file written by `save`, return a tuple (order, data) where `data`
+    is the packed tiling. If `mmap` is True then `data` is a read-only memory
+    map of the file, use `AztecDiamondArray.unpack(order, data)` to rebuild
+    the tiling.
+    """
+    with open(filename, 'rb') as f:
+        magic, order = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError('{} is not a packed Aztec diamond tiling'.format(filename))
+        if not mmap:
+            return order, np.frombuffer(f.read(), dtype=np.uint8)
+    return order, np.memmap(filename, dtype=np.uint8, mode='r', offset=HEADER.size)
+
+
+def save_checkpoint(board, filename, **meta):
+    """
+    Save the order, the packed tiling and the random state of `board` to a
+    checkpoint file in the npz format, `board.rng` must be a `RandomState`
+    instance or the `numpy.random` module. Extra arrays in `meta` are saved
+    along with them. The old file is replaced atomically, so an interrupted
+    save never destroys the previous checkpoint.
+    """
+    name, keys, pos, has_gauss, cached = board.rng.get_state()
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, order=board.order, data=board.pack(),
+                 rng_keys=keys, rng_pos=pos, rng_gauss=(has_gauss, cached), **meta)
+    try:
+        os.replace(tmp, filename)
+    except AttributeError:  # python 2
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp, filename)
+
+
+def load_checkpoint(filename, capacity=None, rates=None):
+    """
+    Read a file written by `save_checkpoint`, return a tuple (board, meta)
+    where `board` is an `AztecDiamondArray` with its own `RandomState` restored
+    from the file and `meta` is a dict of the extra arrays.
+    """
+    with np.load(filename) as data:
+        meta = {key: data[key] for key in data.files
+                if key not in ('order', 'data', 'rng_keys', 'rng_pos', 'rng_gauss')}
+        rng = np.random.RandomState()
+        has_gauss, cached = data['rng_gauss']
+        rng.set_state(('MT19937', data['rng_keys'], int(data['rng_pos']),
+                       int(has_gauss), float(cached)))
+        board = AztecDiamondArray.unpack(int(data['order']), data['data'], rng, capacity, rates)
+    return board, meta
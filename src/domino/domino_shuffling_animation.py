@@ -5,9 +5,17 @@
 Make GIF Animations of the Domino Shuffling Algorithm
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-This script requires ImageMagick be installed on your computer.
-Windows users also need to set the variable `CONVERTER` below
-to be the path to your `convert.exe`.
+By default the frames are rasterized with numpy (see `raster.py`) and
+encoded into the GIF file in the same process, nothing is written to
+disk except the output file. Only the region that changed since the
+previous frame is encoded, and the frames are rendered and encoded by
+a pool of worker processes while the shuffling continues.
+
+The old way of rendering the frames with cairo and assembling them
+with ImageMagick is still available with the `-convert` option. It
+requires ImageMagick be installed on your computer. Windows users also
+need to set the variable `CONVERTER` below to be the path to your
+`convert.exe`.
 
 :copyright (c) 2015 by Zhao Liang.
 """
@@ -16,28 +24,123 @@ import os
 import glob
 import subprocess
 import argparse
+import multiprocessing
+import numpy as np
 import aztec
-from random_tiling import render_with_cairo as render
+import raster
+from aztec_array import AztecDiamondArray
+from encoder import GIFWriter
 
 
 CONVERTER = 'convert'
 
+# the palette has 5 colors, so the color depth is 3 bits and
+# the last index of the color table is never used by the pixels.
+MIN_BITS = 3
+TRANS_INDEX = 7
 
-def make_animation(order, size, filename):
+# the state of the worker processes.
+_patterns = None
+_writer = None
+
+
+def _init_worker(patterns, writer):
+    global _patterns, _writer
+    _patterns = patterns
+    _writer = writer
+
+
+def _encode_frame(task):
+    """Rasterize the keys of a region and encode it into a frame."""
+    keys, left, top, delay = task
+    pixels = raster.rasterize(keys, _patterns)
+    return _writer.encode_frame(pixels, left, top, delay, TRANS_INDEX)
+
+
+def shuffling_frames(order, cell, rng=None, delay=15, last_delay=500):
+    """
+    Run the domino shuffling algorithm up to `order` and yield the frames as tuples
+    (keys, left, top, delay), where `keys` are the cell keys (see `raster.cell_keys`)
+    of the region that changed since the previous frame, and (left, top) is the
+    position of the region in pixels. The first frame is the whole empty canvas.
+    """
+    size = 2 * (order + 1)
+    canvas = np.zeros((size, size), dtype=np.uint8)
+    yield canvas.copy(), 0, 0, delay
+
+    az = AztecDiamondArray(0, rng, capacity=order)
+    for step in range(3 * order):
+        if step % 3 == 0:
+            az.delete()
+        elif step % 3 == 1:
+            az.slide()
+        else:
+            az.create()
+
+        n = az.order
+        keys = canvas.copy()
+        keys[order+1-n: order+1+n, order+1-n: order+1+n] = raster.cell_keys(az.tile, n)
+        changed = keys != canvas
+        if not changed.any():
+            continue
+        canvas = keys
+
+        xs, ys = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+        x0, x1, y0, y1 = xs[0], xs[-1] + 1, ys[0], ys[-1] + 1
+        # the rows of the image go from top to bottom.
+        yield (keys[x0:x1, y0:y1], x0 * cell, (size - y1) * cell,
+               last_delay if step == 3 * order - 1 else delay)
+
+
+def make_animation(order, size, filename, processes=None, seed=None):
     """
     Begin with the Aztec diamond of order zero, repeat the operations
     `delete`, `slide` and `create` until its order reaches `order`.
-    Render one frame for each operation and then use ImageMagick to
-    convert the images to a gif.
+    Render one frame for each operation and encode them into a gif.
 
     INPUT:
 
         - `order`: max steps to run the algorithm.
-         
-        - `size`: size of the GIF image.
 
-        - `filename`: the output .gif filename.
+        - `size`: size of the GIF image, it's rounded down so that
+                  each cell has the same integer size.
+
+        - `filename`: the output .gif filename or a writable binary file object.
+
+        - `processes`: number of worker processes, default to the number of cpus.
+
+        - `seed`: random seed of the algorithm.
+    """
+    cell = max(1, size // (2 * (order + 1)))
+    imgsize = cell * 2 * (order + 1)
+    patterns = raster.block_patterns(cell, raster.default_margin(cell))
+    writer = GIFWriter(imgsize, imgsize, MIN_BITS, raster.palette(), 0)
+    frames = shuffling_frames(order, cell, np.random.RandomState(seed))
+
+    if hasattr(filename, 'write'):
+        f = filename
+    else:
+        f = open(filename, 'wb')
+
+    pool = multiprocessing.Pool(processes, _init_worker, (patterns, writer))
+    try:
+        f.write(writer.header())
+        for frame in pool.imap(_encode_frame, frames):
+            f.write(frame)
+        f.write(writer.trailor)
+    finally:
+        pool.terminate()
+        if f is not filename:
+            f.close()
+
+
+def make_animation_with_convert(order, size, filename):
+    """
+    Render the frames with cairo to temporary png files in the current directory,
+    then use ImageMagick to convert the images to a gif. The inputs are the same
+    with those in `make_animation`.
     """
+    from random_tiling import render_with_cairo as render
     az = aztec.AztecDiamond(0)
     for i in range(order):
         az.delete()
@@ -69,5 +172,13 @@ if __name__ == '__main__':
                         help='image size')
     parser.add_argument('-filename', metavar='f', default='domino_shuffling.gif',
                         help='output filename')
+    parser.add_argument('-processes', metavar='p', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('-seed', type=int, default=None, help='random seed')
+    parser.add_argument('-convert', action='store_true',
+                        help='render the frames with cairo and assemble them with ImageMagick')
     args = parser.parse_args()
-    make_animation(args.order, args.size, args.filename)
+    if args.convert:
+        make_animation_with_convert(args.order, args.size, args.filename)
+    else:
+        make_animation(args.order, args.size, args.filename, args.processes, args.seed)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Exact placement probabilities of dominoes in a uniform
+(or weighted) random tiling of an Aztec diamond.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This is the edge-probability computation in [Propp03], it runs the
+generalized shuffling recurrence once instead of sampling tilings.
+
+The edge weights of an Aztec diamond of order n are given by a 2n x 2n
+matrix. Each 2x2 block [[a, b], [c, d]] at an even position holds the
+four dominoes in one of the n^2 blocks where the `create` step can place
+a pair of dominoes: a is the left vertical domino ('w'), b is the top
+horizontal one ('n'), c is the bottom horizontal one ('s') and d is the
+right vertical one ('e'). The block with index (I, J) has its bottom-left
+cell at (I+J-n, J-I-1).
+
+Urban renewal of all blocks maps the weights to
+[[d, c], [b, a]] / (ad + bc), and the inner (2n-2) x (2n-2) submatrix
+gives the weights of the Aztec diamond of order n-1. The probability
+of a domino e in the order n diamond is
+
+    P(e) = P'(e') + (1 - s) * pi(e),
+
+where e' is the domino opposite to e in its block, P' is the probability
+in the order n-1 diamond (0 for the dominoes on the boundary), s is the
+sum of P' over the block and pi(e) is the probability that the `create`
+step places the pair of dominoes containing e, i.e. ad/(ad+bc) for
+vertical pairs and bc/(ad+bc) for horizontal pairs.
+
+The same probabilities pi(e) drive the `create` step of the weighted
+domino shuffling, see `creation_rates` and `AztecDiamondArray`.
+
+Usage:
+
+    python edge_probability.py -order 100 -filename probabilities.png
+
+:copyright (c) 2015 by Zhao Liang.
+"""
+import argparse
+import numpy as np
+from random_tiling import N_COLOR, S_COLOR, W_COLOR, E_COLOR
+
+
+def blocks(matrix):
+    """Return the four views a, b, c, d of the 2x2 blocks of a 2n x 2n matrix."""
+    return matrix[0::2, 0::2], matrix[0::2, 1::2], matrix[1::2, 0::2], matrix[1::2, 1::2]
+
+
+def urban_renewal(weights):
+    """
+    Apply urban renewal to all blocks of the weight matrix of an
+    Aztec diamond of order n, return the weight matrix of order n-1.
+    The weights are rescaled to avoid overflow, this does not change
+    the probability measure.
+    """
+    a, b, c, d = blocks(weights)
+    delta = a * d + b * c
+    renewed = np.empty_like(weights)
+    ra, rb, rc, rd = blocks(renewed)
+    ra[...], rb[...], rc[...], rd[...] = d / delta, c / delta, b / delta, a / delta
+    renewed = renewed[1:-1, 1:-1]
+    return renewed / renewed.max() if renewed.size else renewed
+
+
+def creation_probabilities(weights, dtype=float):
+    """
+    Return a list `rates` where `rates[k]` is a k x k array of type `dtype`, its item
+    at (I, J) is the probability that the `create` step places a pair of vertical
+    dominoes in the block (I, J) of the order k diamond. `rates[0]` is an empty array.
+    """
+    n = weights.shape[0] // 2
+    rates = [None] * (n + 1)
+    for k in range(n, -1, -1):
+        a, b, c, d = blocks(weights)
+        rates[k] = (a * d / (a * d + b * c)).astype(dtype)
+        if k > 0:
+            weights = urban_renewal(weights)
+    return rates
+
+
+def periodic_weights(n, pattern):
+    """Tile a small matrix `pattern` into the weight matrix of an order n Aztec diamond."""
+    pattern = np.asarray(pattern, dtype=float)
+    reps = [-(-2 * n // s) for s in pattern.shape]
+    return np.tile(pattern, reps)[:2*n, :2*n]
+
+
+def two_periodic_weights(n, a, b):
+    """
+    The two-periodic weighting: all dominoes in a block have weight a or b,
+    and the blocks with these two weights alternate like a chessboard.
+    """
+    return periodic_weights(n, [[a, a, b, b], [a, a, b, b], [b, b, a, a], [b, b, a, a]])
+
+
+# the creation rates of the most recent weighting: (weights, rates).
+_rates_cache = [None, None]
+
+
+def creation_rates(weights):
+    """
+    Return the output of `creation_probabilities` as float32 arrays for the `create`
+    step of `AztecDiamondArray`, they take (4/3) n^3 bytes for an order n diamond.
+
+    The rates of the last weighting are cached, so sampling the same weighting many
+    times computes them only once.
+    """
+    weights = np.asarray(weights, dtype=float)
+    last, rates = _rates_cache
+    if last is None or last.shape != weights.shape or not np.array_equal(last, weights):
+        # drop the old tables before computing the new ones.
+        _rates_cache[:] = [None, None]
+        rates = creation_probabilities(weights, np.float32)
+        _rates_cache[:] = [weights.copy(), rates]
+    return rates
+
+
+def edge_probabilities(n, rates=None):
+    """
+    Return the 2n x 2n matrix of the probabilities of the dominoes in a random
+    tiling of the order n Aztec diamond, laid out as the weight matrix.
+    `rates` is the output of `creation_probabilities`, None means uniform weights,
+    in this case only O(n^2) memory is used.
+    """
+    prob = np.zeros((0, 0))
+    for k in range(1, n + 1):
+        prev = np.zeros((2*k, 2*k))
+        prev[1:-1, 1:-1] = prob
+        pa, pb, pc, pd = blocks(prev)
+        free = 1 - (pa + pb + pc + pd)
+        vertical = 0.5 if rates is None else rates[k]
+
+        prob = np.empty((2*k, 2*k))
+        a, b, c, d = blocks(prob)
+        a[...] = pd + free * vertical
+        d[...] = pa + free * vertical
+        b[...] = pc + free * (1 - vertical)
+        c[...] = pb + free * (1 - vertical)
+    return prob
+
+
+def placement_probabilities(n, rates=None):
+    """
+    Return an array `p` of shape (4, 2n, 2n), `p[k, i+n, j+n]` is the probability
+    that the cell (i, j) is covered by a domino of type 'n', 's', 'w', 'e' for
+    k = 0, 1, 2, 3 respectively. This is the same layout as the `counts` of the
+    class `EnsembleStatistics` in `ensemble.py`.
+    """
+    prob = edge_probabilities(n, rates)
+    a, b, c, d = blocks(prob)
+    # the bottom-left cell of the block (I, J) is at (I+J-n, J-I-1),
+    # it's at index (I+J, J-I+n-1) in the output array.
+    I, J = np.indices((n, n))
+    x, y = I + J, J - I + n - 1
+
+    p = np.zeros((4, 2*n, 2*n))
+    # 'n': the top horizontal domino, 's': the bottom horizontal domino,
+    # 'w': the left vertical domino, 'e': the right vertical domino.
+    for k, q, cells in [(0, b, [(x, y+1), (x+1, y+1)]),
+                        (1, c, [(x, y), (x+1, y)]),
+                        (2, a, [(x, y), (x, y+1)]),
+                        (3, d, [(x+1, y), (x+1, y+1)])]:
+        for u, v in cells:
+            p[k, u, v] = q
+    return p
+
+
+def render_heatmap(p, imgsize, extent, filename, band_size=1 << 24):
+    """
+    Draw the placement probabilities `p` (the output of `placement_probabilities`)
+    to a png image. Each cell is painted with the average of the colors of the four
+    types of dominoes, weighted by their probabilities. The other inputs are the same
+    with those in `random_tiling.render_with_cairo`.
+
+    The pixels are computed from the cell colors by nearest neighbour sampling and
+    streamed to the png file by bands of about `band_size` pixels as in `raster.py`.
+    """
+    from raster import PNGWriter, BACKGROUND_COLOR
+    n = p.shape[1] // 2
+    m = int(np.ceil(2 * extent))
+    colors = np.tensordot(p, np.array([N_COLOR, S_COLOR, W_COLOR, E_COLOR]), axes=([0], [0]))
+    # the cell (u, v) has its bottom-left corner at (u-n, v-n), it's at
+    # index (u-n+e, v-n+e) in `cells`, where e is the integer part of the extent.
+    e = int(np.floor(extent))
+    cells = np.empty((m + 1, m + 1, 3), dtype=np.uint8)
+    cells[...] = np.round(255 * np.array(BACKGROUND_COLOR))
+    u, v = np.nonzero(p.sum(axis=0))
+    # skip the cells outside the picture if the extent is less than the order.
+    inside = (np.minimum(u, v) - n + e >= 0) & (np.maximum(u, v) - n + e <= m)
+    u, v = u[inside], v[inside]
+    cells[u - n + e, v - n + e] = np.round(255 * colors[u, v])
+
+    # the pixel centers in the plane, the y-axis points up.
+    coords = (np.arange(imgsize) + 0.5) * (2.0 * extent / imgsize)
+    xs = np.clip(np.floor(coords - extent).astype(int) + e, 0, m)
+    ys = np.clip(np.floor(extent - coords).astype(int) + e, 0, m)
+    band = max(1, band_size // imgsize)
+    with open(filename, 'wb') as f:
+        png = PNGWriter(f, imgsize, imgsize)
+        for y0 in range(0, imgsize, band):
+            png.write_rows(cells[xs[None, :], ys[y0: y0 + band, None]])
+        png.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-size', metavar='s', type=int,
+                        default=800, help='image size')
+    parser.add_argument('-order', metavar='o', type=int,
+                        default=60, help='order of az graph')
+    parser.add_argument('-filename', metavar='f', type=str,
+                        default='probabilities.png', help='output filename')
+    parser.add_argument('-two_periodic', metavar=('a', 'b'), type=float, nargs=2, default=None,
+                        help='use the two-periodic weights a, b')
+    args = parser.parse_args()
+
+    rates = None
+    if args.two_periodic is not None:
+        rates = creation_probabilities(two_periodic_weights(args.order, *args.two_periodic))
+    p = placement_probabilities(args.order, rates)
+    render_heatmap(p, args.size, args.order + 1, args.filename)
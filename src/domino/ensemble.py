@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Sample an ensemble of uniform random domino tilings of
+an Aztec diamond and collect their statistics.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The samples are split into batches, each batch is run by a worker
+process with its own random seed, the workers return the numbers of
+times each cell is covered by each type of dominoes and these counts
+are added to a running total, so no tiling is kept in memory.
+
+The totals can be saved to a checkpoint file from time to time,
+a run started with the same checkpoint file continues from where
+it stopped and never samples a batch twice.
+
+Usage:
+
+    python ensemble.py -order 100 -samples 10000 -checkpoint stats.npz
+
+:copyright (c) 2015 by Zhao Liang.
+"""
+import os
+import argparse
+import multiprocessing
+import numpy as np
+from aztec_array import AztecDiamondArray, N, S, W, E
+from analysis import temperate_boundary
+
+
+class EnsembleStatistics(object):
+    """
+    Running totals of an ensemble of tilings of order n.
+    `counts[k, i+n, j+n]` is the number of samples in which the cell (i, j)
+    is covered by a domino of type `TYPES[k+1]` ('n', 's', 'w', 'e').
+    `done` is the set of finished batches.
+    """
+
+    def __init__(self, order, seed=0, batch_size=10):
+        self.order = order
+        self.seed = seed
+        self.batch_size = batch_size
+        self.counts = np.zeros((4, 2*order, 2*order), dtype=np.int64)
+        self.samples = 0
+        self.done = set()
+
+    def add(self, batch, counts, samples):
+        """Add the counts of a finished batch."""
+        self.counts += counts
+        self.samples += samples
+        self.done.add(batch)
+
+    def frequencies(self):
+        """The frequencies of the four types of dominoes at each cell."""
+        return self.counts / float(max(self.samples, 1))
+
+    def frozen_boundary(self, eps=0.01):
+        """
+        Return the empirical boundary of the frozen regions as a closed polyline,
+        an array of shape (m, 2) of points (x, y). A cell is frozen if one type
+        of dominoes has frequency at least `1 - eps` on it. For each row of cells
+        the boundary passes the left side of the leftmost temperate cell and
+        the right side of the rightmost one.
+        """
+        temperate = (self.frequencies().max(axis=0) < 1 - eps) & (self.counts.sum(axis=0) > 0)
+        return temperate_boundary(temperate, self.order)
+
+    def save(self, filename):
+        """Save the totals to a checkpoint file, the old file is replaced atomically."""
+        tmp = filename + '.tmp.npz'
+        np.savez(tmp, order=self.order, seed=self.seed, batch_size=self.batch_size,
+                 counts=self.counts, samples=self.samples,
+                 done=np.array(sorted(self.done), dtype=np.int64))
+        try:
+            os.replace(tmp, filename)
+        except AttributeError:  # python 2
+            os.rename(tmp, filename)
+
+    @classmethod
+    def load(cls, filename):
+        data = np.load(filename)
+        stats = cls(int(data['order']), int(data['seed']), int(data['batch_size']))
+        stats.counts[...] = data['counts']
+        stats.samples = int(data['samples'])
+        stats.done = set(data['done'].tolist())
+        return stats
+
+
+def sample_batch(args):
+    """
+    Sample `size` tilings of order n with the random seed (seed, batch),
+    return the batch index, its size and the counts of this batch.
+    """
+    n, seed, batch, size = args
+    rng = np.random.RandomState([seed, batch])
+    counts = np.zeros((4, 2*n, 2*n), dtype=np.int32)
+    for _ in range(size):
+        az = AztecDiamondArray(0, rng, capacity=n)
+        for _ in range(n):
+            az.delete().slide().create()
+        for k, t in enumerate((N, S, W, E)):
+            counts[k] += az.tile == t
+    return batch, size, counts
+
+
+def run_ensemble(order, samples, processes=None, seed=0, batch_size=10,
+                 checkpoint=None, checkpoint_every=10):
+    """
+    Sample `samples` independent tilings of order `order` in a process pool
+    and return an instance of `EnsembleStatistics`.
+
+    INPUT:
+
+        - `processes`: number of worker processes, default to the number of cpus.
+
+        - `seed`: batch k uses the random seed [seed, k], so the result does not
+                  depend on the number of processes.
+
+        - `checkpoint`: filename of the checkpoint file. If it exists then the run
+                        resumes from it, the order, seed and batch size saved
+                        in it override the arguments.
+
+        - `checkpoint_every`: save the checkpoint after this number of batches.
+    """
+    if checkpoint is not None and os.path.exists(checkpoint):
+        stats = EnsembleStatistics.load(checkpoint)
+    else:
+        stats = EnsembleStatistics(order, seed, batch_size)
+
+    num_batches = (samples + stats.batch_size - 1) // stats.batch_size
+    tasks = [(stats.order, stats.seed, k, min(stats.batch_size, samples - k * stats.batch_size))
+             for k in range(num_batches) if k not in stats.done]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for count, (batch, size, counts) in enumerate(pool.imap_unordered(sample_batch, tasks), 1):
+            stats.add(batch, counts, size)
+            if checkpoint is not None and count % checkpoint_every == 0:
+                stats.save(checkpoint)
+    finally:
+        pool.terminate()
+
+    if checkpoint is not None:
+        stats.save(checkpoint)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-order', metavar='o', type=int,
+                        default=60, help='order of az graph')
+    parser.add_argument('-samples', metavar='s', type=int,
+                        default=1000, help='number of samples')
+    parser.add_argument('-processes', metavar='p', type=int,
+                        default=None, help='number of worker processes')
+    parser.add_argument('-seed', type=int, default=0, help='random seed')
+    parser.add_argument('-batch', type=int, default=10,
+                        help='number of samples in each task of the workers')
+    parser.add_argument('-checkpoint', metavar='c', type=str, default=None,
+                        help='checkpoint file, the run resumes from it if it exists')
+    parser.add_argument('-filename', metavar='f', type=str,
+                        default='ensemble.npz', help='output filename')
+    args = parser.parse_args()
+
+    stats = run_ensemble(args.order, args.samples, args.processes, args.seed,
+                         args.batch, args.checkpoint)
+    np.savez(args.filename, frequencies=stats.frequencies(),
+             boundary=stats.frozen_boundary(), samples=stats.samples)
@@ -47,29 +47,31 @@ def render_with_cairo(az, imgsize, extent, filename):
 
     margin = 0.1
 
+    # group the dominoes by their colors, each group is filled with one call.
+    rects = {'n': [], 's': [], 'w': [], 'e': []}
     for (i, j) in az.cells:
         if (az.is_black(i, j) and az.tile[(i, j)] is not None):
             if az.tile[(i, j)] == 'n':
-                ctx.rectangle(i - 1 + margin, j + margin,
-                              2 - 2 * margin, 1 - 2 * margin)
-                ctx.set_source_rgb(*N_COLOR)
+                rects['n'].append((i - 1 + margin, j + margin,
+                                   2 - 2 * margin, 1 - 2 * margin))
 
             if az.tile[(i, j)] == 's':
-                ctx.rectangle(i + margin, j + margin,
-                              2 - 2 * margin, 1 - 2 * margin)
-                ctx.set_source_rgb(*S_COLOR)
-                    
+                rects['s'].append((i + margin, j + margin,
+                                   2 - 2 * margin, 1 - 2 * margin))
+
             if az.tile[(i, j)] == 'w':
-                ctx.rectangle(i + margin, j + margin,
-                              1 - 2 * margin, 2 - 2 * margin)
-                ctx.set_source_rgb(*W_COLOR)
+                rects['w'].append((i + margin, j + margin,
+                                   1 - 2 * margin, 2 - 2 * margin))
 
             if az.tile[(i, j)] == 'e':
-                ctx.rectangle(i + margin, j - 1 + margin,
-                              1 - 2 * margin, 2 - 2 * margin)
-                ctx.set_source_rgb(*E_COLOR)
+                rects['e'].append((i + margin, j - 1 + margin,
+                                   1 - 2 * margin, 2 - 2 * margin))
 
-            ctx.fill()
+    for key, color in zip('nswe', (N_COLOR, S_COLOR, W_COLOR, E_COLOR)):
+        for rect in rects[key]:
+            ctx.rectangle(*rect)
+        ctx.set_source_rgb(*color)
+        ctx.fill()
 
     surface.write_to_png(filename)
 
@@ -107,14 +109,31 @@ def render_with_matplotlib(az, imgsize, extent, filename):
     fig.savefig(filename)
 
 
+def render_with_numpy(az, imgsize, extent, filename):
+    """
+    Draw current tiling of `az` to a png image with numpy, see `raster.py`.
+    This is much faster than cairo and matplotlib for large orders and
+    works for very large images (20000x20000 and up) with bounded memory.
+    `az` can be an instance of the AztecDiamond class or the AztecDiamondArray
+    class, the other inputs are the same with those in `render_with_cairo`.
+    """
+    from aztec_array import AztecDiamondArray
+    from raster import render_tiling
+    if not isinstance(az, AztecDiamondArray):
+        az = AztecDiamondArray.from_dict(az)
+    render_tiling(az.tile, az.order, imgsize, extent, filename)
+
+
 def render(program, *args, **kwargs):
-    """`program must be either `cairo` or `matplotlib`."""
+    """`program must be `cairo`, `matplotlib` or `numpy`."""
     if program == 'cairo':
         render_with_cairo(*args, **kwargs)
     elif program == 'matplotlib':
         render_with_matplotlib(*args, **kwargs)
+    elif program == 'numpy':
+        render_with_numpy(*args, **kwargs)
     else:
-        raise ValueError('Program must be cairo or matplotlib!')
+        raise ValueError('Program must be cairo, matplotlib or numpy!')
 
 
 if __name__ == '__main__':
@@ -127,10 +146,63 @@ if __name__ == '__main__':
                         default='random_tiling.png', help='output filename')
     parser.add_argument('-prog', metavar='p', type=str,
                         default='cairo', help='program to draw the tiling')
+    parser.add_argument('-numpy', action='store_true',
+                        help='run the algorithm on numpy arrays, much faster for large orders')
+    parser.add_argument('-save', metavar='t', type=str, default=None,
+                        help='also save the tiling in the packed binary form (implies -numpy)')
+    parser.add_argument('-two_periodic', metavar=('a', 'b'), type=float, nargs=2, default=None,
+                        help='sample with the two-periodic weights a, b (implies -numpy)')
+    parser.add_argument('-seed', type=int, default=None, help='random seed (implies -numpy)')
+    parser.add_argument('-checkpoint', metavar='c', type=str, default=None,
+                        help='save the state of the run to this file from time to time (implies -numpy)')
+    parser.add_argument('-checkpoint_every', metavar='k', type=int, default=100,
+                        help='save the checkpoint every k orders')
+    parser.add_argument('-resume', action='store_true',
+                        help='continue from the checkpoint file if it exists')
+    parser.add_argument('-snapshot_every', metavar='k', type=int, default=0,
+                        help='save the tiling in the packed binary form every k orders (implies -numpy)')
+    parser.add_argument('-snapshot', metavar='p', type=str, default='snapshot_{:05d}.azt',
+                        help='filename pattern of the snapshots, formatted with the order')
     args = parser.parse_args()
+    if args.resume and args.checkpoint is None:
+        parser.error('-resume requires -checkpoint')
+    args.numpy = (args.numpy or args.save is not None or args.two_periodic is not None
+                  or args.seed is not None or args.checkpoint is not None or args.snapshot_every > 0)
+
+    if args.numpy:
+        import os
+        import numpy as np
+        from aztec_array import AztecDiamondArray, save, save_checkpoint, load_checkpoint
+        rates = None
+        weights = np.array(args.two_periodic or [], dtype=float)
+        if args.two_periodic is not None:
+            from edge_probability import creation_rates, two_periodic_weights
+            rates = creation_rates(two_periodic_weights(args.order, *args.two_periodic))
+
+        if args.resume and os.path.exists(args.checkpoint):
+            az, meta = load_checkpoint(args.checkpoint, args.order, rates)
+            # the creation rates of a weighted run depend on the final order.
+            if not np.array_equal(meta['weights'], weights) or \
+                    (len(weights) > 0 and int(meta['target']) != args.order):
+                raise ValueError('The checkpoint was saved by a run with different weights!')
+        else:
+            az = AztecDiamondArray(0, np.random.RandomState(args.seed), args.order, rates)
+    else:
+        az = aztec.AztecDiamond(0)
 
-    az = aztec.AztecDiamond(0)
-    for _ in range(args.order):
+    while az.order < args.order:
         az = az.delete().slide().create()
+        if args.numpy:
+            if args.checkpoint is not None and (az.order % args.checkpoint_every == 0
+                                                or az.order == args.order):
+                save_checkpoint(az, args.checkpoint, target=args.order, weights=weights)
+            if args.snapshot_every > 0 and az.order % args.snapshot_every == 0:
+                save(az, args.snapshot.format(az.order))
+
+    if args.save is not None:
+        save(az, args.save)
+
+    if args.numpy and args.prog != 'numpy':
+        az = az.to_dict()
 
     render(args.prog, az, args.size, az.order+1, args.filename)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Rasterize domino tilings with NumPy arrays
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Each cell of a tiling (in the array form of `aztec_array.py`) becomes
+a square block of pixels. A domino is drawn like in `random_tiling.py`:
+it's filled with the color of its type and leaves a thin margin of
+background color on its boundary, so the block of a cell depends on
+its type and on the side of the cell where the other half of the domino
+lies. Each cell is mapped to a key `type + 5 * side` and the image is
+obtained by indexing a lookup table of pixel blocks with the keys,
+no Python object is created for the dominoes.
+
+The pixels are palette indices: 0 is the background and 1, 2, 3, 4 are
+the types 'n', 's', 'w', 'e', the same as the codes in `aztec_array.py`.
+
+`render_tiling` draws a tiling to a png file of any size with bounded
+memory: the image is rendered in horizontal bands, each band is mapped
+to RGB through the palette and handed to a streaming png writer, so
+only one band of pixels is kept in memory at a time.
+
+:copyright (c) 2015 by Zhao Liang.
+"""
+import zlib
+import struct
+import numpy as np
+from aztec_array import EMPTY, N, S, W, E, LEFT, RIGHT, DOWN, UP, partner_sides
+from random_tiling import N_COLOR, S_COLOR, W_COLOR, E_COLOR
+
+
+BACKGROUND_COLOR = (1, 1, 1)
+COLORS = [BACKGROUND_COLOR, N_COLOR, S_COLOR, W_COLOR, E_COLOR]
+
+
+def palette(colors=COLORS):
+    """Convert a list of (r, g, b) colors in [0, 1] to a flat list of bytes."""
+    return [int(round(255 * x)) for color in colors for x in color]
+
+
+def cell_keys(tile, n):
+    """
+    Return the keys of the cells of a tiling `tile` of order n,
+    an uint8 array of the same shape as `tile`.
+    """
+    return (tile + 5 * partner_sides(tile, n)).astype(np.uint8)
+
+
+def block_patterns(cell, margin):
+    """
+    Return an uint8 array of shape (25, cell, cell), the pixel block of the key k
+    is `patterns[k]` with its top row first.
+    """
+    patterns = np.zeros((25, cell, cell), dtype=np.uint8)
+    for t in (N, S, W, E):
+        for side in (LEFT, RIGHT, DOWN, UP):
+            block = patterns[t + 5 * side]
+            block[...] = t
+            if margin > 0:
+                if side != LEFT:
+                    block[:, :margin] = EMPTY
+                if side != RIGHT:
+                    block[:, -margin:] = EMPTY
+                if side != UP:
+                    block[:margin, :] = EMPTY
+                if side != DOWN:
+                    block[-margin:, :] = EMPTY
+    return patterns
+
+
+def default_margin(cell):
+    """The margin of the dominoes is 1/10 of the cell size as in `random_tiling.py`."""
+    return int(round(0.1 * cell)) if cell >= 4 else 0
+
+
+def rasterize(keys, patterns):
+    """
+    Convert an array of cell keys, indexed by (x, y) as the tilings, to an image
+    of palette indices. The rows of the image go from top to bottom, i.e. the
+    last column of `keys` becomes the first rows of the image.
+    """
+    cell = patterns.shape[1]
+    blocks = patterns[keys.T[::-1]]
+    rows, cols = keys.shape[1], keys.shape[0]
+    return blocks.transpose(0, 2, 1, 3).reshape(rows * cell, cols * cell)
+
+
+# `misc/tiledrender.py` has a copy of this class, keep the two in sync.
+class PNGWriter(object):
+    """
+    Write an 8-bit RGB png image row by row. The compressed data is written
+    to the file as soon as zlib gives it out, so the whole image is never
+    kept in memory.
+    """
+
+    def __init__(self, f, width, height, level=6, chunk_size=1 << 20):
+        """
+        INPUTS:
+
+            - `f`: a writable binary file object.
+
+            - `width`, `height`: size of the image in pixels.
+
+            - `level`: compression level of zlib.
+
+            - `chunk_size`: the compressed data is written in IDAT chunks of about this size.
+        """
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(level)
+        self.buffer = bytearray()
+        f.write(b'\x89PNG\r\n\x1a\n')
+        self.write_chunk(b'IHDR', struct.pack('>2I5B', width, height, 8, 2, 0, 0, 0))
+
+    def write_chunk(self, tag, data):
+        self.f.write(struct.pack('>I', len(data)) + tag + data
+                     + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rgb):
+        """Append an uint8 array of shape (rows, width, 3) to the image."""
+        rows = rgb.shape[0]
+        if rgb.shape[1:] != (self.width, 3) or self.rows + rows > self.height:
+            raise ValueError('The rows do not fit in the image!')
+        # each row begins with the filter type byte 0 (no filter).
+        data = np.zeros((rows, 3 * self.width + 1), dtype=np.uint8)
+        data[:, 1:] = rgb.reshape(rows, -1)
+        self.buffer += self.compressor.compress(data.tobytes())
+        self.rows += rows
+        while len(self.buffer) >= self.chunk_size:
+            self.write_chunk(b'IDAT', bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+
+    def close(self):
+        """Finish the image, all rows must have been written."""
+        if self.rows != self.height:
+            raise ValueError('Expect {} rows but got {}'.format(self.height, self.rows))
+        self.buffer += self.compressor.flush()
+        self.write_chunk(b'IDAT', bytes(self.buffer))
+        self.write_chunk(b'IEND', b'')
+        self.buffer = bytearray()
+
+
+def render_tiling(tile, n, imgsize, extent, filename, band_size=1 << 24):
+    """
+    Draw a tiling to a png image, the result looks like `random_tiling.render_with_cairo`.
+
+    INPUT:
+
+        - `tile`: the tiling of an Aztec diamond of order n in the array form,
+                  e.g. the `tile` attribute of an `AztecDiamondArray`.
+
+        - `imgsize`: image size in pixels, at least 2 * extent. Each cell is a square
+                     block of `imgsize // (2 * extent)` pixels and the diamond is centered.
+
+        - `extent`: range of the axis: [-extent, extent] x [-extent, extent].
+
+        - `filename`: output filename or a writable binary file object.
+
+        - `band_size`: approximate number of pixels rendered at a time.
+    """
+    if extent < n:
+        raise ValueError('The extent must be at least the order of the tiling!')
+    cell = imgsize // (2 * extent)
+    if cell < 1:
+        raise ValueError('The image is too small, each cell needs at least one pixel!')
+    patterns = block_patterns(cell, default_margin(cell))
+    colors = np.array(palette(), dtype=np.uint8).reshape(-1, 3)
+    # the diamond is placed at the center of the image.
+    offset = (imgsize - 2 * n * cell) // 2
+    band = max(1, band_size // (imgsize * cell))  # number of rows of cells in a band.
+
+    def background(rows):
+        rgb = np.empty((rows, imgsize, 3), dtype=np.uint8)
+        rgb[...] = colors[EMPTY]
+        return rgb
+
+    keys = cell_keys(tile, n)
+    if hasattr(filename, 'write'):
+        f = filename
+    else:
+        f = open(filename, 'wb')
+    try:
+        png = PNGWriter(f, imgsize, imgsize)
+        png.write_rows(background(offset))
+        # the rows of cells are rendered from top to bottom.
+        for y1 in range(2 * n, 0, -band):
+            pixels = rasterize(keys[:, max(y1 - band, 0): y1], patterns)
+            rgb = background(pixels.shape[0])
+            rgb[:, offset: offset + pixels.shape[1]] = colors[pixels]
+            png.write_rows(rgb)
+        png.write_rows(background(imgsize - png.rows))
+        png.close()
+    finally:
+        if f is not filename:
+            f.close()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Draw many primitives with few cairo calls
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Filling or stroking each shape separately costs a handful of cairo calls
+per shape (set the color, build the path, fill, stroke). A `BatchPainter`
+collects the shapes first, groups them by their style, and then builds
+one path for each group and issues a single `fill` or `stroke` for it.
+All fills are painted before all strokes, so the edges are never covered
+by the faces of the neighbouring shapes.
+
+Example:
+
+    painter = BatchPainter()
+    painter.add_polygons(rhombi, fill=(1, 0, 0), stroke=(0, 0, 0), linewidth=0.1)
+    painter.add_segments(edges, stroke=(0.2, 0.2, 0.2), linewidth=0.01)
+    painter.draw(ctx)
+"""
+
+import collections
+
+
+class BatchPainter(object):
+
+    def __init__(self):
+        # {(kind, color, linewidth): list of (points, closed)}, kind is 'fill' or 'stroke'.
+        self.groups = collections.OrderedDict()
+
+    def add(self, kind, color, linewidth, points, closed):
+        key = (kind, tuple(color), linewidth)
+        self.groups.setdefault(key, []).append((points, closed))
+
+    def add_polygons(self, polygons, fill=None, stroke=None, linewidth=None):
+        """
+        Add polygons given by an array of shape (m, k, 2) (or a list of lists
+        of points), they are filled with the color `fill` and their boundaries
+        are stroked with the color `stroke`, either of them can be None.
+        """
+        for poly in polygons:
+            if fill is not None:
+                self.add('fill', fill, None, poly, True)
+            if stroke is not None:
+                self.add('stroke', stroke, linewidth, poly, True)
+
+    def add_segments(self, segments, stroke, linewidth):
+        """Add line segments given by an array of shape (m, 2, 2)."""
+        for seg in segments:
+            self.add('stroke', stroke, linewidth, seg, False)
+
+    def add_rectangles(self, rectangles, fill):
+        """Add rectangles (x, y, width, height) filled with the color `fill`."""
+        for x, y, w, h in rectangles:
+            self.add('fill', fill, None, [(x, y), (x + w, y), (x + w, y + h), (x, y + h)], True)
+
+    def draw(self, ctx):
+        """Draw all the shapes collected so far to the cairo context `ctx` and clear them."""
+        groups = sorted(self.groups.items(), key=lambda item: item[0][0] == 'stroke')
+        for (kind, color, linewidth), shapes in groups:
+            ctx.new_path()
+            for points, closed in shapes:
+                x, y = points[0]
+                ctx.move_to(x, y)
+                for x, y in points[1:]:
+                    ctx.line_to(x, y)
+                if closed:
+                    ctx.close_path()
+            ctx.set_source_rgb(*color)
+            if kind == 'fill':
+                ctx.fill()
+            else:
+                ctx.set_line_width(linewidth)
+                ctx.stroke()
+        self.groups.clear()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Root systems projected to their Coxeter planes
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This script generalizes `e8.py` to the root systems of the types
+A_n, B_n, D_n, E6, E7, E8, F4 and H4. For a given type it
+
+1. generates all roots by applying the simple reflections to the simple
+   roots until no new roots appear, each round reflects all roots at once.
+2. connects the pairs of roots at the minimal distance, the distances are
+   read off from a single Gram matrix of all roots.
+3. splits the Dynkin diagram into two sets I, J of pairwise orthogonal
+   simple roots and builds a basis of the Coxeter plane from an eigenvector
+   of the (normalized) Cartan matrix, see Humphreys's book
+
+       "Reflection Groups and Coxeter Groups", section 17, chapter 3.
+
+4. projects all roots to the plane with one matrix product.
+
+The results are cached on disk in the directory `coxeter_cache`, one
+npz file per type, so rendering the same type again is instant.
+
+Usage:
+
+    python coxeter_plane.py -type E8 -size 600 -filename e8.png
+
+:copyright (c) 2016 by Zhao Liang.
+"""
+
+import os
+import argparse
+import numpy as np
+
+
+CACHE_DIR = 'coxeter_cache'
+
+PHI = (1 + np.sqrt(5)) / 2
+
+# simple roots of E8 as in `e8.py`, the Dynkin diagram is
+# 1---2---3---4---5---6---7
+#                 |
+#                 8
+# E7 and E6 are obtained by removing the vertices 1 and 2.
+E8_SIMPLE_ROOTS = np.array([[1, -1, 0, 0, 0, 0, 0, 0],
+                            [0, 1, -1, 0, 0, 0, 0, 0],
+                            [0, 0, 1, -1, 0, 0, 0, 0],
+                            [0, 0, 0, 1, -1, 0, 0, 0],
+                            [0, 0, 0, 0, 1, -1, 0, 0],
+                            [0, 0, 0, 0, 0, 1, 1, 0],
+                            [-.5, -.5, -.5, -.5, -.5, -.5, -.5, -.5],
+                            [0, 0, 0, 0, 0, 1, -1, 0]])
+
+# simple roots of F4 and H4, both Dynkin diagrams are chains.
+F4_SIMPLE_ROOTS = np.array([[0, 1, -1, 0],
+                            [0, 0, 1, -1],
+                            [0, 0, 0, 1],
+                            [.5, -.5, -.5, -.5]])
+
+H4_SIMPLE_ROOTS = np.array([[-1, 0, 0, 0],
+                            [PHI / 2, -.5, -.5 / PHI, 0],
+                            [0, PHI / 2, .5 / PHI, -.5],
+                            [0, 0, 0, 1]])
+
+
+def simple_roots(cartan_type):
+    """
+    Return the simple roots (listed by rows) of a root system of type
+    'An', 'Bn', 'Dn' (n is the rank), 'E6', 'E7', 'E8', 'F4' or 'H4'.
+    """
+    family, rank = cartan_type[0].upper(), int(cartan_type[1:])
+    if family in 'ABD':
+        # e_i - e_{i+1} for i = 1, ..., n-1.
+        chain = np.eye(rank + 1)[:-1] - np.eye(rank + 1, k=1)[:-1]
+        if family == 'A' and rank >= 1:
+            return chain
+        if family == 'B' and rank >= 2:
+            # plus the short root e_n.
+            return np.vstack([chain[:-1, :-1], np.eye(rank)[-1]])
+        if family == 'D' and rank >= 4:
+            # plus the root e_{n-1} + e_n.
+            last = np.zeros(rank)
+            last[-2:] = 1
+            return np.vstack([chain[:-1, :-1], last])
+    if family == 'E' and rank in (6, 7, 8):
+        return E8_SIMPLE_ROOTS[8 - rank:]
+    if cartan_type.upper() == 'F4':
+        return F4_SIMPLE_ROOTS
+    if cartan_type.upper() == 'H4':
+        return H4_SIMPLE_ROOTS
+    raise ValueError('Unknown Cartan type: {}'.format(cartan_type))
+
+
+def reflect(vectors, root):
+    """Reflect the vectors (listed by rows) about the hyperplane orthogonal to `root`."""
+    return vectors - np.outer(2 * np.dot(vectors, root) / np.dot(root, root), root)
+
+
+def unique_rows(vectors, decimals=8):
+    """Remove the duplicate rows of `vectors` up to rounding errors."""
+    _, index = np.unique(np.round(vectors, decimals), axis=0, return_index=True)
+    return vectors[np.sort(index)]
+
+
+def generate_roots(simple):
+    """Close the simple roots under the simple reflections to get all roots."""
+    roots = unique_rows(np.vstack([simple, -simple]))
+    while True:
+        images = np.vstack([roots] + [reflect(roots, alpha) for alpha in simple])
+        new_roots = unique_rows(images)
+        if len(new_roots) == len(roots):
+            return roots
+        roots = new_roots
+
+
+def nearest_edges(roots):
+    """Return the pairs (i, j), i < j of roots at the minimal distance."""
+    gram = np.dot(roots, roots.T)
+    norms = np.diag(gram)
+    dist2 = norms[:, None] + norms[None, :] - 2 * gram
+    nonzero = dist2[dist2 > 1e-8]
+    close = np.isclose(dist2, nonzero.min()) & (dist2 > 1e-8)
+    return np.column_stack(np.nonzero(np.triu(close, 1)))
+
+
+def bipartition(simple):
+    """
+    Split the vertices of the Dynkin diagram (a tree) into two sets of
+    pairwise orthogonal simple roots, return a boolean array that marks one set.
+    """
+    adjacent = np.abs(np.dot(simple, simple.T)) > 1e-8
+    side = np.full(len(simple), -1)
+    side[0] = 0
+    stack = [0]
+    while stack:
+        i = stack.pop()
+        for j in np.flatnonzero(adjacent[i]):
+            if j != i and side[j] < 0:
+                side[j] = 1 - side[i]
+                stack.append(j)
+    return side == 0
+
+
+def coxeter_plane_basis(simple):
+    """Return an orthonormal basis (u, v) of the Coxeter plane as a 2 x d array."""
+    unit = simple / np.linalg.norm(simple, axis=1)[:, None]
+    cartan = 2 * np.dot(unit, unit.T)
+    # the eigenvalues returned by eigh() are in ascending order
+    # and the eigenvectors are listed by columns.
+    c = np.linalg.eigh(cartan)[1][:, 0]
+    part = bipartition(simple)
+    u = np.dot(c * part, unit)
+    v = np.dot(c * ~part, unit)
+    # Gram-Schmidt u, v and normalize them to unit vectors.
+    u /= np.linalg.norm(u)
+    v = v - np.dot(u, v) * u
+    v /= np.linalg.norm(v)
+    return np.array([u, v])
+
+
+def compute(cartan_type):
+    """
+    Return a dict with the items 'roots', 'edges', 'basis' and 'points'
+    (the roots projected to the Coxeter plane) of the given type.
+    """
+    simple = simple_roots(cartan_type)
+    roots = generate_roots(simple)
+    basis = coxeter_plane_basis(simple)
+    return {'roots': roots,
+            'edges': nearest_edges(roots),
+            'basis': basis,
+            'points': np.dot(roots, basis.T)}
+
+
+def load_or_compute(cartan_type, cache_dir=CACHE_DIR):
+    """The same as `compute` but the results are cached on disk, None disables the cache."""
+    if cache_dir is None:
+        return compute(cartan_type)
+    filename = os.path.join(cache_dir, '{}.npz'.format(cartan_type.upper()))
+    if os.path.exists(filename):
+        with np.load(filename) as data:
+            return {key: data[key] for key in data.files}
+    result = compute(cartan_type)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    np.savez(filename, **result)
+    return result
+
+
+def ring_indices(points, decimals=6):
+    """Group the projected roots into rings of the same modulus, return the ring of each root."""
+    modulus = np.round(np.linalg.norm(points, axis=1), decimals)
+    return np.unique(modulus, return_inverse=True)[1].ravel()
+
+
+def render(result, image_size, filename, linewidth=0.0018, markersize=0.05):
+    """Draw the projected roots and edges like `e8.py`, each ring has its own color."""
+    import cairocffi as cairo
+    from palettable.colorbrewer.qualitative import Set1_9
+
+    points, edges = result['points'], result['edges']
+    # scale the picture so that the largest ring has radius 2 as in `e8.py`.
+    points = points * 2.0 / np.linalg.norm(points, axis=1).max()
+    rings = ring_indices(points)
+    colors = np.array(Set1_9.mpl_colors)[rings % 9]
+    extent = 2.4
+
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, image_size, image_size)
+    ctx = cairo.Context(surface)
+    ctx.scale(image_size/(extent*2.0), -image_size/(extent*2.0))
+    ctx.translate(extent, -extent)
+    ctx.set_source_rgb(1, 1, 1)
+    ctx.paint()
+
+    ctx.set_source_rgb(0.2, 0.2, 0.2)
+    ctx.set_line_width(linewidth)
+    for i, j in edges:
+        ctx.move_to(*points[i])
+        ctx.line_to(*points[j])
+    ctx.stroke()
+
+    for (x, y), color in zip(points, colors):
+        grad = cairo.RadialGradient(x, y, 0.0001, x, y, markersize)
+        grad.add_color_stop_rgb(0, *color)
+        grad.add_color_stop_rgb(1, *color/2)
+        ctx.set_source(grad)
+        ctx.arc(x, y, markersize, 0, 2*np.pi)
+        ctx.fill()
+
+    surface.write_to_png(filename)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-type', metavar='t', type=str, default='E8',
+                        help='Cartan type, e.g. A7, B5, D6, E6, E7, E8, F4, H4')
+    parser.add_argument('-size', metavar='s', type=int, default=600,
+                        help='image size')
+    parser.add_argument('-filename', metavar='f', type=str, default=None,
+                        help='output filename, default to TYPE.png')
+    parser.add_argument('-cache_dir', metavar='c', type=str, default=CACHE_DIR,
+                        help='directory of the cached results')
+    args = parser.parse_args()
+    render(load_or_compute(args.type, args.cache_dir), args.size,
+           args.filename or '{}.png'.format(args.type.upper()))
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# A copy of `domino/encoder.py`, keep the two in sync.
+"""
+~~~~~~~~~~~~~~~~~~~~
+A simple GIF encoder
+~~~~~~~~~~~~~~~~~~~~
+
+This is a copy of `domino/encoder.py` (which is adapted from `wilson/encoder.py`)
+so that the scripts in this directory do not depend on the other directories.
+It encodes 2d numpy arrays of palette indices as frames at given positions,
+so an animation only needs to encode the region that changed in each frame.
+
+Reference for the GIF89a specification:
+
+    http://giflib.sourceforge.net/whatsinagif/index.html
+"""
+from struct import pack
+
+
+def pack_blocks(data):
+    """
+    Pack the LZW encoded image data into blocks.
+    Each block is of length <= 255 and is preceded by a byte
+    in 0-255 that indicates the length of this block.
+    """
+    stream = bytearray()
+    for k in range(0, len(data), 255):
+        chunk = data[k: k+255]
+        stream.append(len(chunk))
+        stream += chunk
+    return stream
+
+
+class GIFWriter(object):
+    """
+    Structure of a GIF file: (in the order they appear)
+    1. always begins with the logical screen descriptor.
+    2. then follows the global color table.
+    3. then follows the loop control block (specify the number of loops).
+    4. then follows the image data of the frames, each frame is further divided into:
+       (i) a graphics control block that specify the delay and transparent color of this frame.
+       (ii) the image descriptor.
+       (iii) the LZW encoded data.
+    5. finally the trailor '0x3B'.
+    """
+
+    def __init__(self, width, height, min_bits, palette, loop):
+        """
+        INPUTS:
+
+            - `width`, `height`: size of the image in pixels.
+
+            - `min_bits`: color depth (minimal number of bits needed to represent the colors).
+
+            - `palette`: a 1-d list of colors used by the image.
+
+            - `loop`: number of loops of the image. 0 means loop infinitely (and this is the default).
+        """
+        self.num_colors = 1 << min_bits  # number of colors in the global color table.
+        # constants for LZW encoding.
+        self._palette_bits = max(min_bits, 2)  # the minimal code size in GIF is 2.
+        self._clear_code = 1 << self._palette_bits
+        self._end_code = self._clear_code + 1
+        self._max_codes = 4096
+
+        # ---------- the logical screen descriptor ----------
+        packed_byte = 1  # the packed byte in the logical screen descriptor.
+        packed_byte = packed_byte << 3 | (min_bits - 1)  # color resolution.
+        packed_byte = packed_byte << 1 | 0               # sorted flag.
+        packed_byte = packed_byte << 3 | (min_bits - 1)  # size of the global color table.
+        self.logical_screen_descriptor = pack('<6s2H3B', b'GIF89a', width, height, packed_byte, 0, 0)
+        # ---------------------------------------------------
+
+        # ---------- the global color table ----------
+        valid_len = 3 * self.num_colors
+        palette = list(palette)[:valid_len]
+        palette += [0] * (valid_len - len(palette))
+        self.global_color_table = bytearray(palette)
+        # --------------------------------------------
+
+        # ---------- the loop control block ----------
+        self.loop_control = pack('<3B8s3s2BHB', 0x21, 0xFF, 11, b'NETSCAPE', b'2.0', 3, 1, loop, 0)
+        # --------------------------------------------
+
+        self.trailor = bytearray([0x3B])  # the trailing byte indicates the end of the file.
+
+    def header(self):
+        """The bytes before the first frame."""
+        return self.logical_screen_descriptor + self.global_color_table + self.loop_control
+
+    @staticmethod
+    def graphics_control_block(delay, trans_index):
+        """This block specifies the delay and transparent color of a frame."""
+        return pack("<4BH2B", 0x21, 0xF9, 4, 0b00000101, delay, trans_index, 0)
+
+    @staticmethod
+    def image_descriptor(left, top, width, height):
+        """
+        This block specifies the position of a frame (relative to the window).
+        The ending packed byte field is 0 since we do not need a local color table.
+        """
+        return pack('<B4HB', 0x2C, left, top, width, height, 0)
+
+    def encode_frame(self, pixels, left, top, delay, trans_index):
+        """
+        Encode a 2d array of palette indices into a frame at position (left, top),
+        including its graphics control block.
+        """
+        height, width = pixels.shape
+        return (self.graphics_control_block(delay, trans_index)
+                + self.image_descriptor(left, top, width, height)
+                + self.LZW_encode(pixels.ravel().tolist()))
+
+    def LZW_encode(self, input_data):
+        """Implement the LZW-encoding algorithm for GIF specification."""
+        code_length = self._palette_bits + 1
+        next_code = self._end_code + 1
+        code_table = {}
+        output = bytearray()
+        acc = self._clear_code  # always start with the clear code.
+        nbits = code_length
+
+        def emit(code, length):
+            # the codes are packed from the lower bits to the higher bits.
+            out = acc | code << nbits
+            size = nbits + length
+            while size >= 8:
+                output.append(out & 0xFF)
+                out >>= 8
+                size -= 8
+            return out, size
+
+        if not input_data:
+            acc, nbits = emit(self._end_code, code_length)
+        else:
+            prefix = input_data[0]
+            for c in input_data[1:]:
+                key = (prefix, c)
+                code = code_table.get(key)
+                if code is not None:
+                    prefix = code
+                    continue
+                acc, nbits = emit(prefix, code_length)  # output the prefix.
+                code_table[key] = next_code  # add new code in the table.
+                prefix = c  # suffix becomes the current pattern.
+
+                next_code += 1
+                if next_code == 2**code_length + 1:
+                    code_length += 1
+                if next_code == self._max_codes:
+                    acc, nbits = emit(self._clear_code, code_length)
+                    next_code = self._end_code + 1
+                    code_length = self._palette_bits + 1
+                    code_table = {}
+
+            acc, nbits = emit(prefix, code_length)
+            acc, nbits = emit(self._end_code, code_length)
+        if nbits > 0:
+            output.append(acc)
+        return bytearray([self._palette_bits]) + pack_blocks(output) + bytearray([0])
@@ -33,11 +33,38 @@ there exists a DFA such that the words accepted by the DFA are eactly
 the elements of the group under the shortest-lex-order representation,
 thus finding all elements in this group amounts to traversing a finite
 directed graph, which is a much easier job. (we will use breadth-first search here)
+
+`traverse` below walks the automaton one word at a time and is kept for
+reference. The drawing uses `traverse_levels` instead: each element g is
+stored as an integer 2x2 matrix, all words of the same length form one
+BFS level and the next level is computed by batched matrix products.
+The vertices of the fundamental domain are kept in projective coordinates
+(z, 1) and (1, 0) for the infinity, so a whole level is mapped in one
+vectorized evaluation of the Mobius transformations.
+
+`dfs` enumerates the same elements depth-first with O(length) memory,
+its position is a word that can be saved and resumed, see also `shards`.
+
+The domains that are smaller than a pixel or lie outside the picture are
+culled together with their descendants, so the cost of drawing is bounded
+by the resolution of the image rather than the number of words.
+
+The script can also be imported as a library, the automaton of the traversal
+is memoized and cairo is only imported when rendering, so many pictures can
+be rendered in one process. Large pictures can be rendered in tiles by all
+the cores with the option `-tile_size`, each tile only traverses the domains
+that intersect it.
+
+Usage:
+
+    python modulargroup.py -length 10 15 -filename modulargroup_{}.png
+    python modulargroup.py -length 40 -width 16000 -height 8000 -tile_size 1000
 """
 
+import argparse
 import collections
 import cmath
-import cairocffi as cairo
+import functools
 
 
 # None means 'infinity'
@@ -83,6 +110,186 @@ automaton = {0: {'A': 1, 'B': 2, 'C': 3},
             }
 
 
+def memoize(func):
+    """Cache the results of a function of hashable arguments."""
+    cache = {}
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        if args not in cache:
+            cache[args] = func(*args)
+        return cache[args]
+    return wrapper
+
+
+SYMBOLS = 'ABC'
+
+# the matrices of the generators A, B, C.
+GENERATORS = [((1, 1), (0, 1)),
+              ((1, -1), (0, 1)),
+              ((0, -1), (1, 0))]
+
+
+@memoize
+def reversed_automaton():
+    """
+    Return the automaton of the reversed words in the same form as `automaton`.
+
+    A word w is accepted by `automaton` iff all its suffixes are, so the reversed
+    words are closed under taking prefixes and can be traversed as a tree too.
+    The state reached by a reversed word u is the set of states of `automaton`
+    that can read the word reverse(u), and u is accepted iff 0 is in this set.
+    The sets are numbered in the order they are found, the full set is 0.
+    """
+    full = frozenset(automaton)
+    numbers = {full: 0}
+    sets = [full]
+    result = {}
+    for state in sets:  # `sets` grows while it's iterated.
+        result[numbers[state]] = {}
+        for symbol in SYMBOLS:
+            target = frozenset(p for p, arrows in automaton.items()
+                               if arrows.get(symbol) in state)
+            if 0 in target:
+                if target not in numbers:
+                    numbers[target] = len(sets)
+                    sets.append(target)
+                result[numbers[state]][symbol] = numbers[target]
+    return result
+
+
+def transition_table(dfa, symbols=SYMBOLS):
+    """An automaton as an array, `table[state, k]` is the target of the k-th symbol or -1."""
+    import numpy as np
+    table = np.full((len(dfa), len(symbols)), -1, dtype=np.int64)
+    for state, arrows in dfa.items():
+        for symbol, to in arrows.items():
+            table[state, symbols.index(symbol)] = to
+    return table
+
+
+def wall_culler(xlim, ylim, pixel_size):
+    """
+    Return a function for the `cull` argument of `traverse_levels` (or `traverse_group`)
+    that keeps the domains whose descendants may intersect the viewport [xlim] x [ylim]
+    and be at least `pixel_size` wide or high.
+
+    Testing the domain itself is not enough: a domain outside the viewport may
+    have descendants inside. The test is made on the half-plane that contains
+    all the descendants.
+    If the word g ends with the k-th symbol s, then g(D) is next to its parent
+    across the geodesic through the two vertices of g(D) other than the k-th one,
+    and the descendants of g lie on the same side of it as the k-th vertex.
+    """
+    import numpy as np
+
+    def cull(points, infinite, last):
+        rows = np.arange(len(points))
+        k = np.maximum(last, 0)
+        others = (k[:, None] + [1, 2]) % 3
+        z0, z1 = points[rows, others[:, 0]], points[rows, others[:, 1]]
+        inf0, inf1 = infinite[rows, others[:, 0]], infinite[rows, others[:, 1]]
+        opposite, far = points[rows, k], infinite[rows, k]
+        x0, y0, x1, y1 = z0.real, z0.imag, z1.real, z1.imag
+        # a geodesic with an end at the infinity is a vertical line.
+        line_x = np.where(inf0, x1, x0)
+        dx = x1 - x0
+        vertical = inf0 | inf1 | (np.abs(dx) < 1e-12)
+        dx = np.where(vertical, 1, dx)
+        center = 0.5 * (x0 + x1) + 0.5 * (y0 + y1) * (y1 - y0) / dx
+        radius = np.abs(z0 - center)
+        inside = ~vertical & ~far & (np.abs(opposite - center) < radius)
+        right = vertical & ~far & (opposite.real > line_x)
+        left = vertical & ~far & (opposite.real < line_x)
+
+        # the bounding box of the half-plane, it's unbounded outside a circle.
+        xmin = np.where(inside, center - radius, np.where(right, line_x, -np.inf))
+        xmax = np.where(inside, center + radius, np.where(left, line_x, np.inf))
+        ymax = np.where(inside, radius, np.inf)
+        visible = (xmax >= xlim[0]) & (xmin <= xlim[1]) & (ymax >= ylim[0])
+        return (last < 0) | (visible & ((xmax - xmin >= pixel_size) | (ymax >= pixel_size)))
+    return cull
+
+
+def traverse_levels(length, start_domain=None, cull=None):
+    """
+    Traverse the group level by level. For each level k = 0, 1, ..., `length`
+    yield a tuple (k, states, last, matrices, points, infinite) of arrays, the
+    i-th item of them describes the i-th element g of length k:
+
+        - `states[i]`: the state of `reversed_automaton()` reached by g.
+
+        - `last[i]`: the index in `SYMBOLS` of the first transformation applied
+                     to the domain, -1 for the identity.
+
+        - `matrices[i]`: the 2x2 integer matrix of g.
+
+        - `points[i]`: the vertices of the domain g(D), with `infinite[i]` marking
+                       the vertices at the infinity (their `points` are meaningless).
+
+    The elements are the same as in `traverse`, but the words are read in the
+    reverse order, so each element is its parent composed with a generator s
+    on the right. The domain g(s(D)) lies next to g(D) on the far side from D,
+    and all the descendants of g lie beyond g(D), they only shrink or move away.
+    So if `cull` is given, a function that takes `points`, `infinite` and `last`
+    and returns a boolean array of the domains to keep (see `wall_culler`),
+    the culled domains and all their descendants are skipped.
+    """
+    if start_domain is None:
+        start_domain = FUND_DOMAIN
+    return traverse_group(length, reversed_automaton(), SYMBOLS, GENERATORS,
+                          start_domain, cull)
+
+
+def traverse_group(length, dfa, symbols, generators, start_domain,
+                   cull=None, reflections=None):
+    """
+    The level by level traversal of `traverse_levels` for any group acting on
+    the upper plane whose elements are the words accepted by `dfa` (a dict
+    in the form of `automaton`, 0 is the starting state), the word g followed
+    by the symbol `symbols[k]` is the transformation g(s(z)) where s is given
+    by the 2x2 real matrix `generators[k]`.
+
+    `reflections` is None or a list of booleans, the k-th generator is the
+    anti-Mobius map s(z) = (a conj(z) + b) / (c conj(z) + d) if it's True.
+    Since the matrices are real, g(s(z)) is still given by the product of
+    their matrices, only the parity of the number of conjugations is tracked.
+    """
+    import numpy as np
+    # projective coordinates of the vertices, listed by columns.
+    vertices = np.array([[1 if z is None else z for z in start_domain],
+                         [0 if z is None else 1 for z in start_domain]], dtype=complex)
+    table = transition_table(dfa, symbols)
+    generators = np.asarray(generators)
+    if reflections is None:
+        reflections = [False] * len(symbols)
+
+    states = np.zeros(1, dtype=np.int64)
+    last = np.full(1, -1, dtype=np.int64)
+    matrices = np.eye(2, dtype=generators.dtype)[None, ...]
+    odd = np.zeros(1, dtype=bool)
+    for level in range(length + 1):
+        images = np.matmul(matrices, np.where(odd[:, None, None], vertices.conj(), vertices))
+        num, den = images[:, 0], images[:, 1]
+        infinite = den == 0
+        points = num / np.where(infinite, 1, den)
+        if cull is not None:
+            keep = cull(points, infinite, last)
+            states, last, matrices, odd = states[keep], last[keep], matrices[keep], odd[keep]
+            points, infinite = points[keep], infinite[keep]
+        yield level, states, last, matrices, points, infinite
+
+        if level < length:
+            # the word g followed by the symbol k is the transformation g(k(z)).
+            targets = table[states]
+            children = [np.flatnonzero(targets[:, k] >= 0) for k in range(len(symbols))]
+            states = np.concatenate([targets[ind, k] for k, ind in enumerate(children)])
+            last = np.concatenate([np.full(len(ind), k) for k, ind in enumerate(children)])
+            matrices = np.concatenate([np.matmul(matrices[ind], generators[k])
+                                       for k, ind in enumerate(children)])
+            odd = np.concatenate([odd[ind] ^ reflections[k] for k, ind in enumerate(children)])
+
+
 def traverse(length, start_domain):
     queue = collections.deque([('', 0, start_domain)])
     while queue:
@@ -94,23 +301,139 @@ def traverse(length, start_domain):
                 queue.append((word + symbol, to, transform(symbol, domain)))
 
 
-class HyperbolicDrawing(cairo.Context):
+def read_word(word, start_domain):
+    """
+    Run `word` through the automaton, return the lists of states and domains
+    of its prefixes (the first items are the empty word). Raise ValueError
+    if the word is not accepted.
+    """
+    states, domains = [0], [start_domain]
+    for symbol in word:
+        to = automaton[states[-1]].get(symbol)
+        if to is None:
+            raise ValueError('{} is not accepted by the automaton'.format(word))
+        states.append(to)
+        domains.append(transform(symbol, domains[-1]))
+    return states, domains
+
+
+def dfs(length, start_domain, start='', stop=None):
+    """
+    Yield the same tuples (word, state, domain) as `traverse` but in depth-first
+    order, which is the lexicographic order of the words. Only the current path
+    is kept in memory, so it uses O(length) memory.
+
+    The word of an item works as a cursor: `start` and `stop` are words (the
+    latter is not necessarily accepted), the enumeration begins at `start`
+    (inclusive) and ends before `stop`. So an interrupted enumeration can be
+    restarted from the last word that has not been processed, and the words
+    can be split into shards with `shards` below.
+    """
+    states, domains = read_word(start, start_domain)
+    word = list(start)
+    while True:
+        if stop is not None and ''.join(word) >= stop:
+            return
+        yield ''.join(word), states[-1], domains[-1]
+
+        # go down to the first child, or go to the next sibling of the
+        # deepest ancestor that has one.
+        if len(word) < length and automaton[states[-1]]:
+            symbol = min(automaton[states[-1]])
+        else:
+            symbol = None
+            while word and symbol is None:
+                last = word.pop()
+                states.pop()
+                domains.pop()
+                symbol = min([s for s in automaton[states[-1]] if s > last] or [None])
+            if symbol is None:
+                return
+        word.append(symbol)
+        states.append(automaton[states[-1]][symbol])
+        domains.append(transform(symbol, domains[-1]))
+
+
+def count_table(length):
+    """
+    Return a list `counts` where `counts[r][state]` is the number of words of
+    length at most r that begin at `state`, for r = 0, 1, ..., `length`.
+    """
+    counts = [dict.fromkeys(automaton, 1)]
+    for _ in range(length):
+        prev = counts[-1]
+        counts.append({state: 1 + sum(prev[to] for to in arrows.values())
+                       for state, arrows in automaton.items()})
+    return counts
+
+
+def count_words(length):
+    """Return the number of words of length at most `length`."""
+    return count_table(length)[length][0]
+
+
+def word_at(length, index):
+    """
+    Return the word at position `index` (0-based) in the depth-first order of
+    `dfs(length, ...)`, or None if there are not so many words.
+    """
+    counts = count_table(length)
+    if index >= counts[length][0]:
+        return None
+    word, state = '', 0
+    while index > 0:
+        index -= 1  # skip the word itself.
+        for symbol in sorted(automaton[state]):
+            size = counts[length - len(word) - 1][automaton[state][symbol]]
+            if index < size:
+                word += symbol
+                state = automaton[state][symbol]
+                break
+            index -= size
+    return word
+
+
+def shards(length, num_shards):
+    """
+    Split the words of length at most `length` into `num_shards` contiguous ranges
+    of nearly equal sizes, return a list of (start, stop) words for `dfs`.
+    """
+    total = count_words(length)
+    cuts = [word_at(length, total * k // num_shards) for k in range(num_shards)] + [None]
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+FUND_DOMAIN = (cmath.exp(cmath.pi*1j/3), cmath.exp(cmath.pi*2j/3), None)
+
+
+class HyperbolicDrawing(object):
     """A quick extension of the `cairo.Context` class for drawing hyperbolic
-    objects in the Poincare upper plane.
+    objects in the Poincare upper plane. Other methods are delegated to the
+    wrapped context, so cairo is not needed until a drawing is created.
     """
+    def __init__(self, surface):
+        import cairocffi as cairo
+        self.context = cairo.Context(surface)
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
     def set_axis(self, **kwargs):
+        # `size` is the size of the whole picture in pixels, the surface may be
+        # a tile of it with its top-left corner at `offset`.
         surface = self.get_target()
-        width = surface.get_width()
-        height = surface.get_height()
+        width, height = kwargs.get('size', (surface.get_width(), surface.get_height()))
+        offset_x, offset_y = kwargs.get('offset', (0, 0))
 
         xlim = kwargs.get('xlim', [-2, 2])
         x_min, x_max = xlim
         ylim = kwargs.get('ylim', [0, 2])
         y_min, y_max = ylim
 
+        self.translate(-offset_x, -offset_y)
         self.scale(width * 1.0 / (x_max - x_min),
                    height * 1.0 / (y_min - y_max))
-        self.translate(abs(x_min), -y_max)
+        self.translate(-x_min, -y_max)
 
         bg_color = kwargs.get('background_color', (1, 1, 1))
         self.set_source_rgb(*bg_color)
@@ -159,32 +482,100 @@ class HyperbolicDrawing(cairo.Context):
         self.stroke()
 
 
-width = 800
-height = 400
+XLIM, YLIM = (-2, 2), (0, 2)
 
-length = 15
-fund_domain = [cmath.exp(cmath.pi*1j/3), cmath.exp(cmath.pi*2j/3), None]
 
-surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
-ctx = HyperbolicDrawing(surface)
-ctx.set_axis(xlim=[-2, 2], ylim=[0, 2], background_color=(1, 1, 1))
-ctx.set_line_join(2)
-# draw the x-axis
-ctx.move_to(-2, 0)
-ctx.line_to(2, 0)
-ctx.set_source_rgb(0, 0, 0)
-ctx.set_line_width(0.03)
-ctx.stroke()
+def tile_viewport(xlim, ylim, size, offset, tile, pad=0):
+    """
+    Return the part (xlim, ylim) of the picture [xlim] x [ylim] of `size` pixels
+    that is covered by a tile of `tile` pixels with its top-left corner at `offset`,
+    enlarged by `pad` in each direction.
+    """
+    sx = float(xlim[1] - xlim[0]) / size[0]
+    sy = float(ylim[1] - ylim[0]) / size[1]
+    left = xlim[0] + offset[0] * sx
+    top = ylim[1] - offset[1] * sy
+    return ((left - pad, left + tile[0] * sx + pad),
+            (top - tile[1] * sy - pad, top + pad))
 
-for word, state, triangle in traverse(length, fund_domain):
-    if word:
-        if word[0] == 'C':
-            fc_color = (1, 0.5, 0.75)
-        else:
-            fc_color = None
+
+def draw_tiling(surface, size, offset, length, cull=True):
+    """
+    Draw the domains g(D) for the words g of length at most `length` to `surface`,
+    which is the tile with its top-left corner at `offset` of the picture of
+    `size` pixels. If `cull` is True then the domains smaller than a pixel or
+    outside the tile are skipped, so a tile only traverses its own domains.
+    """
+    ctx = HyperbolicDrawing(surface)
+    ctx.set_axis(xlim=XLIM, ylim=YLIM, size=size, offset=offset, background_color=(1, 1, 1))
+    ctx.set_line_join(2)
+    # draw the x-axis
+    ctx.move_to(-2, 0)
+    ctx.line_to(2, 0)
+    ctx.set_source_rgb(0, 0, 0)
+    ctx.set_line_width(0.03)
+    ctx.stroke()
+
+    if cull:
+        # the edges are at most 0.04 wide, so the domains that are that close
+        # to the tile may cover some of its pixels.
+        tile = (surface.get_width(), surface.get_height())
+        xlim, ylim = tile_viewport(XLIM, YLIM, size, offset, tile, pad=0.02)
+        cull = wall_culler(xlim, ylim, float(XLIM[1] - XLIM[0]) / size[0])
     else:
-        fc_color = (0.5, 0.5, 0.5)
+        cull = None
+    for level, states, last, matrices, points, infinite in traverse_levels(length, FUND_DOMAIN, cull):
+        for head, triangle, inf in zip(last, points, infinite):
+            if level > 0:
+                if SYMBOLS[head] == 'C':
+                    fc_color = (1, 0.5, 0.75)
+                else:
+                    fc_color = None
+            else:
+                fc_color = (0.5, 0.5, 0.5)
 
-    ctx.render_domain(triangle, facecolor=fc_color, linewidth=0.04/(len(word)+1))
+            domain = [None if i else z for z, i in zip(triangle, inf)]
+            ctx.render_domain(domain, facecolor=fc_color, linewidth=0.04/(level+1))
 
-surface.write_to_png('modulargroup.png')
+
+def render(length=15, width=800, height=400, filename='modulargroup.png', cull=True,
+           tile_size=None, processes=None):
+    """
+    Draw the domains g(D) for the words g of length at most `length` to a png image.
+    If `cull` is True then the domains smaller than a pixel or outside the image are skipped.
+
+    If `tile_size` is given the image is drawn in tiles of this size by `processes`
+    worker processes (None means all the cores) and streamed to the file by bands,
+    see `tiledrender.py`. This is the way to render posters.
+    """
+    if tile_size is not None:
+        from tiledrender import render_tiles
+        render_tiles(draw_tiling, (length, cull), width, height, filename, tile_size, processes)
+        return
+
+    import cairocffi as cairo
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+    draw_tiling(surface, (width, height), (0, 0), length, cull)
+    surface.write_to_png(filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-length', metavar='l', type=int, nargs='+', default=[15],
+                        help='max lengths of the words, one picture is rendered for each length')
+    parser.add_argument('-width', type=int, default=800, help='image width')
+    parser.add_argument('-height', type=int, default=400, help='image height')
+    parser.add_argument('-filename', metavar='f', type=str, default='modulargroup.png',
+                        help='output filename, "{}" in it is replaced by the length')
+    parser.add_argument('-tile_size', type=int, default=None,
+                        help='render in tiles of this size in parallel')
+    parser.add_argument('-processes', type=int, default=None,
+                        help='number of worker processes for the tiles, default to all the cores')
+    args = parser.parse_args(argv)
+    for length in args.length:
+        render(length, args.width, args.height, args.filename.format(length),
+               tile_size=args.tile_size, processes=args.processes)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,27 +10,68 @@ Reference:
     Algebraic theory of Penrose's non-periodic tilings of the plane.
                                                      N.G. de Bruijn.
 
-Usage: python penrose.py
+`compute_rhombus` computes one rhombus and is kept for reference, the
+drawing uses `rhombi_of_pair`, which computes the intersections, index
+vectors and vertices as whole arrays. It works for any n-fold multigrid,
+set `NUM_GRIDS` to get tilings with n//2 types of rhombi. Only the lines
+whose rhombi may fall in the image are used, see `line_ranges`, so the
+work is proportional to the area of the image and it has no holes.
+
+The rhombi also form a planar graph (see `tiling_graph`), its vertices are
+deduplicated by their integer index vectors, so each edge is drawn once.
+The graph can be saved with the option `-export` and queried with a
+`GridIndex`, e.g. by `locate` and `vertex_census`.
+
+With `-animate` the shifts sweep along a line and a gif animation is made,
+between two frames only the rhombi whose index vectors change are recomputed
+and repainted, see `ShiftSweep`.
+
+Large posters are drawn in horizontal bands by all the cores and streamed
+to the png file with the helper `tiledrender.py`.
+
+Usage:
+
+    python penrose.py
+    python penrose.py -width 30000 -height 20000 -num_lines 600 -band_size 500
+    python penrose.py -animate 200 -filename penrose.gif
 
 Each time you run this script it outputs a different pattern,
 these patterns are almost surely not isomorphic with each other.
 """
+import argparse
 import itertools
 import random
 import numpy as np
-import cairocffi as cairo
+from batchdraw import BatchPainter
 
 
 palette = ['#E41A1C', '#377EB8', '#4DAF4A', '#984EA3', '#FF7F00', '#FFFF33',
            '#A65628', '#F781BF', '#66C2A5', '#FC8D62', '#8DA0CB', '#E78AC3',
            '#A6D854', '#FFD92F', '#E5C494', '#B3B3B3']
 
+
+def multigrid(n):
+    """
+    Return the unit normals of the n grids of an n-fold multigrid. For even n
+    they span half the circle, otherwise some grids would be parallel.
+    """
+    k = np.arange(n)
+    if n % 2 == 0:
+        return np.exp(1j*np.pi*k/n)
+    return np.exp(2j*np.pi*k/n)
+
+
 WIDTH = 1200
 HEIGHT = 720
+# the image shows the part [-NUM_LINES, NUM_LINES] of the plane along its longer side.
 NUM_LINES = 25
+NUM_GRIDS = 5
+# a multigrid of n grids has n//2 types of rhombi, the extra colors are for n > 5.
 THIN_COLOR, FAT_COLOR, EDGE_COLOR = random.sample(palette, 3)
-GRIDS = [np.exp(2j*np.pi*i/5) for i in range(5)]
-SHIFTS = np.random.random(5)
+EXTRA_COLORS = random.sample([c for c in palette if c not in (THIN_COLOR, FAT_COLOR, EDGE_COLOR)],
+                             max(0, NUM_GRIDS//2 - 2))
+GRIDS = multigrid(NUM_GRIDS)
+SHIFTS = np.random.random(NUM_GRIDS)
 BACKGROUND_COLOR = '#000000'
 LINE_WIDTH = 0.1
 
@@ -69,42 +110,589 @@ def compute_rhombus(r, s, kr, ks):
             [(kr, ks), (kr+1, ks), (kr+1, ks+1), (kr, ks+1)]]
 
 
-def main():
-    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, WIDTH, HEIGHT)
+def intersections(grids, shifts, r, s, kr, ks):
+    """The intersections of the lines kr, ks (arrays) of the grids r, s."""
+    gr, gs = grids[r], grids[s]
+    # solve Re(z/GRIDS[r]) + SHIFTS[r] = kr, Re(z/GRIDS[s]) + SHIFTS[s] = ks.
+    return (gr * (ks - shifts[s]) - gs * (kr - shifts[r])) * 1j / (gs / gr).imag
+
+
+def rhombi_of_pair(grids, shifts, r, s, kr, ks):
+    """
+    Vectorized version of `compute_rhombus` for the grids r < s and the arrays
+    of line indices `kr`, `ks` (they are broadcast against each other).
+    Return the integer index vectors of the first vertices and the four vertices
+    of the rhombi as two arrays of shapes kr.shape + (n,) and kr.shape + (4,).
+    """
+    grids = np.asarray(grids)
+    shifts = np.asarray(shifts)
+    kr, ks = np.broadcast_arrays(kr, ks)
+    gr, gs = grids[r], grids[s]
+    z = intersections(grids, shifts, r, s, kr, ks)
+
+    # the index vectors, one grid at a time to save memory.
+    index = np.empty(kr.shape + (len(grids),), dtype=np.int64)
+    for i in range(len(grids)):
+        index[..., i] = np.ceil((z / grids[i]).real + shifts[i])
+    # the r-th and s-th items are kr and ks, see `compute_rhombus`.
+    index[..., r] = kr
+    index[..., s] = ks
+    first = np.dot(index, grids)
+    return index, first[..., None] + np.array([0, gr, gr + gs, gs])
+
+
+def compute_rhombi(grids, shifts, lines):
+    """
+    Compute the rhombi of all pairs of grids r < s and all pairs of lines kr, ks at once.
+
+    INPUTS:
+
+        - `grids`, `shifts`: the unit normals and the shifts of the n grids.
+
+        - `lines`: an array of K integers, the indices of the lines used in each grid.
+
+    Return a tuple (pairs, index, vertices) of arrays:
+
+        - `pairs`: shape (P, 2), the pairs (r, s).
+
+        - `index`: shape (P, K, K, n), the integer index vectors of the first
+                   vertices, `index[p, i, j]` is for the lines kr = lines[i]
+                   and ks = lines[j] in the grids of `pairs[p]`.
+
+        - `vertices`: shape (P, K, K, 4), the four vertices of the rhombi.
+    """
+    lines = np.asarray(lines)
+    n, num = len(grids), len(lines)
+    pairs = np.array(list(itertools.combinations(range(n), 2)))
+    index = np.empty((len(pairs), num, num, n), dtype=np.int64)
+    vertices = np.empty((len(pairs), num, num, 4), dtype=complex)
+    for p, (r, s) in enumerate(pairs):
+        index[p], vertices[p] = rhombi_of_pair(grids, shifts, r, s, lines[:, None], lines[None, :])
+    return pairs, index, vertices
+
+
+def line_ranges(grids, shifts, r, s, viewport):
+    """
+    Return the ranges of the lines kr, ks of the grids r, s whose rhombi may
+    intersect the viewport (xmin, xmax, ymin, ymax).
+
+    The first vertex of the rhombus at the intersection z of the lines is
+    sum_j index_j * GRIDS[j] with index_j = Re(z/GRIDS[j]) + SHIFTS[j] + e_j,
+    where 0 <= e_j < 1 and e_r = e_s = 0. For the multigrids here the sum of
+    Re(z/GRIDS[j]) * GRIDS[j] is n*z/2, so the whole rhombus lies within the
+    distance n of the point n*z/2 + sum_j SHIFTS[j] * GRIDS[j]. Hence only the
+    intersections in a rectangle are needed, and the ranges of kr and ks are
+    read off from the corners of this rectangle.
+    """
+    grids = np.asarray(grids)
+    n = len(grids)
+    center = np.dot(shifts, grids)
+    xmin, xmax, ymin, ymax = viewport
+    corners = np.array([complex(x, y) for x in (xmin - n, xmax + n) for y in (ymin - n, ymax + n)])
+    corners = (corners - center) * 2.0 / n
+    kr = (corners / grids[r]).real + shifts[r]
+    ks = (corners / grids[s]).real + shifts[s]
+    return (np.arange(np.floor(kr.min()), np.ceil(kr.max()) + 1, dtype=np.int64),
+            np.arange(np.floor(ks.min()), np.ceil(ks.max()) + 1, dtype=np.int64))
+
+
+def visible_rhombi(grids, shifts, viewport):
+    """
+    Return the rhombi that intersect the viewport (xmin, xmax, ymin, ymax) as a tuple
+    of flat arrays (pairs, lines, index, vertices) of shapes (m, 2), (m, 2), (m, n) and
+    (m, 4): the grids (r, s), the lines (kr, ks), the index vector of the first vertex
+    and the four vertices of each rhombus. The work is proportional to the area of the
+    viewport, see `line_ranges`.
+    """
+    xmin, xmax, ymin, ymax = viewport
+    result = []
+    for r, s in itertools.combinations(range(len(grids)), 2):
+        kr, ks = np.meshgrid(*line_ranges(grids, shifts, r, s, viewport), indexing='ij')
+        index, vertices = rhombi_of_pair(grids, shifts, r, s, kr.ravel(), ks.ravel())
+        x, y = vertices.real, vertices.imag
+        keep = ((x.max(axis=1) >= xmin) & (x.min(axis=1) <= xmax)
+                & (y.max(axis=1) >= ymin) & (y.min(axis=1) <= ymax))
+        result.append((np.tile([r, s], (keep.sum(), 1)),
+                       np.column_stack([kr.ravel(), ks.ravel()])[keep],
+                       index[keep], vertices[keep]))
+    return tuple(np.concatenate(arrays) for arrays in zip(*result))
+
+
+def rhombus_type(r, s, n):
+    """
+    The rhombi of the grids r < s are congruent iff they have the same acute
+    angle, which is a multiple of pi/n. Return 0, 1, ..., n//2 - 1 from the
+    thinnest to the fattest type, the acute angle is (type + 1) * pi/n.
+    For 5 grids the thin rhombi have s-r = 2 or 3, the fat ones s-r = 1 or 4.
+    Works for arrays of r and s too.
+    """
+    # the angle between the grids r and s in units of pi/n, up to multiples of pi.
+    units = (s - r) * (1 if n % 2 == 0 else 2) % n
+    return np.minimum(units, n - units) - 1
+
+
+def tiling_graph(grids, pairs, index):
+    """
+    Build the planar graph of the rhombi given by `pairs` and `index` (as returned
+    by `visible_rhombi`). Two rhombi share a vertex iff the vertex has the same
+    integer index vector in both, so the vertices are deduplicated exactly.
+    Return a dict of arrays:
+
+        - 'vertex_index': shape (V, n), the index vectors of the vertices.
+
+        - 'points': shape (V, 2), the positions of the vertices.
+
+        - 'faces': shape (F, 4), the vertices of the rhombi in the order of `compute_rhombus`.
+
+        - 'edges': shape (E, 2), each edge is listed once with the smaller vertex first.
+
+        - 'face_edges': shape (F, 4), the edges of the rhombi, the k-th edge joins
+                        the k-th and (k+1)-th vertices.
+
+        - 'types', 'pairs': shapes (F,) and (F, 2), the types of the rhombi
+                            (see `rhombus_type`) and their grids (r, s).
+    """
+    grids = np.asarray(grids)
+    num, n = index.shape
+    r, s = pairs[:, 0], pairs[:, 1]
+    rows = np.arange(num)
+    # the four vertices are index, index + e_r, index + e_r + e_s, index + e_s.
+    corners = np.repeat(index[:, None, :], 4, axis=1)
+    corners[rows, 1, r] += 1
+    corners[rows, 2, r] += 1
+    corners[rows, 2, s] += 1
+    corners[rows, 3, s] += 1
+    vertex_index, faces = np.unique(corners.reshape(-1, n), axis=0, return_inverse=True)
+    faces = faces.reshape(num, 4)
+    sides = np.sort(np.stack([faces, np.roll(faces, -1, axis=1)], axis=-1).reshape(-1, 2), axis=1)
+    edges, face_edges = np.unique(sides, axis=0, return_inverse=True)
+    points = np.dot(vertex_index, grids)
+    return {'vertex_index': vertex_index,
+            'points': np.column_stack([points.real, points.imag]),
+            'faces': faces,
+            'edges': edges,
+            'face_edges': face_edges.reshape(num, 4),
+            'types': rhombus_type(r, s, n),
+            'pairs': pairs}
+
+
+def save_graph(filename, graph):
+    """Save the arrays of a graph returned by `tiling_graph` to a npz file."""
+    np.savez_compressed(filename, **graph)
+
+
+def load_graph(filename):
+    with np.load(filename) as data:
+        return {key: data[key] for key in data.files}
+
+
+def vertex_census(graph, n):
+    """
+    Count the vertex configurations of a tiling of n grids. The configuration of
+    an interior vertex is the sorted tuple of the angles (in units of pi/n) of the
+    rhombi around it, e.g. (2, 2, 2, 2, 2) is the 'sun' of a Penrose tiling.
+    The vertices on the boundary of the patch are skipped. Return a dict
+    {configuration: number of vertices}.
+    """
+    faces, pairs = graph['faces'], graph['pairs']
+    grids = multigrid(n)
+    # the angle at the first vertex is the angle between GRIDS[r] and GRIDS[s].
+    angle = np.rint(np.abs(np.angle(grids[pairs[:, 1]] / grids[pairs[:, 0]])) * n / np.pi)
+    angles = np.column_stack([angle, n - angle, angle, n - angle]).astype(np.int64)
+    counts = np.zeros((len(graph['points']), n + 1), dtype=np.int64)
+    np.add.at(counts, (faces.ravel(), angles.ravel()), 1)
+    interior = np.dot(counts, np.arange(n + 1)) == 2 * n
+    configs, numbers = np.unique(counts[interior], axis=0, return_counts=True)
+    return {tuple(np.repeat(np.arange(n + 1), c).tolist()): int(k) for c, k in zip(configs, numbers)}
+
+
+class GridIndex(object):
+    """
+    A spatial index of points in the plane by square buckets of `cell_size`.
+    The points are sorted by their buckets, so a bucket is a slice of `order`.
+    """
+
+    def __init__(self, points, cell_size):
+        self.points = np.asarray(points, dtype=float)
+        self.cell_size = float(cell_size)
+        keys = np.floor(self.points / self.cell_size).astype(np.int64)
+        self.origin = keys.min(axis=0)
+        self.shape = keys.max(axis=0) - self.origin + 1
+        flat = (keys[:, 0] - self.origin[0]) * self.shape[1] + keys[:, 1] - self.origin[1]
+        self.order = np.argsort(flat, kind='mergesort')
+        self.starts = np.searchsorted(flat[self.order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def query_radius(self, point, radius):
+        """Return the indices of the points within the distance `radius` of `point`."""
+        point = np.asarray(point, dtype=float)
+        low = np.floor((point - radius) / self.cell_size).astype(np.int64) - self.origin
+        high = np.floor((point + radius) / self.cell_size).astype(np.int64) - self.origin
+        low, high = np.maximum(low, 0), np.minimum(high, self.shape - 1)
+        if (low > high).any():
+            return np.zeros(0, dtype=np.int64)
+        # the buckets in a column of the box are contiguous.
+        candidates = np.concatenate([
+            self.order[self.starts[i * self.shape[1] + low[1]]:self.starts[i * self.shape[1] + high[1] + 1]]
+            for i in range(low[0], high[0] + 1)])
+        dist = np.linalg.norm(self.points[candidates] - point, axis=1)
+        return candidates[dist <= radius]
+
+
+def face_index(graph):
+    """
+    Return a `GridIndex` of the centers of the rhombi. A rhombus with unit sides
+    lies within the distance 1 of its center, so buckets of size 2 are used.
+    """
+    return GridIndex(graph['points'][graph['faces']].mean(axis=1), 2)
+
+
+def locate(graph, index, point):
+    """
+    Return the rhombus that contains `point` (or -1), where `index` is
+    returned by `face_index(graph)`.
+    """
+    point = np.asarray(point, dtype=float)
+    for face in index.query_radius(point, 1):
+        quad = graph['points'][graph['faces'][face]]
+        sides = np.roll(quad, -1, axis=0) - quad
+        rel = point - quad
+        cross = sides[:, 0] * rel[:, 1] - sides[:, 1] * rel[:, 0]
+        if (cross >= 0).all() or (cross <= 0).all():
+            return face
+    return -1
+
+
+def draw_tiling(surface, size, offset, grids, shifts, num_lines, face_colors,
+                edge_color, background_color, line_width):
+    """
+    Draw the tiling to `surface`, which is the tile with its top-left corner at
+    `offset` of the picture of `size` pixels (see `tiledrender.py`). Only the
+    rhombi that overlap the surface are computed. The colors are rgb tuples,
+    `face_colors` are for the types of rhombi given by `rhombus_type`.
+    """
+    import cairocffi as cairo
     ctx = cairo.Context(surface)
     ctx.set_line_cap(cairo.LINE_CAP_ROUND)
     ctx.set_line_join(cairo.LINE_JOIN_ROUND)
-    ctx.set_line_width(LINE_WIDTH)
-    scale = max(WIDTH, HEIGHT) / (2.0 * NUM_LINES)
+    width, height = size
+    scale = max(width, height) / (2.0 * num_lines)
+    ctx.translate(-offset[0], -offset[1])
     ctx.scale(scale, scale)
-    ctx.translate(NUM_LINES, NUM_LINES)
+    ctx.translate(num_lines, num_lines)
 
-    ctx.set_source_rgb(*htmlcolor_to_rgb(BACKGROUND_COLOR))
+    ctx.set_source_rgb(*background_color)
     ctx.paint()
 
-    for r, s in itertools.combinations(range(5), 2):
-        for kr, ks in itertools.product(range(-NUM_LINES, NUM_LINES + 1), repeat=2):
-            # if s-r = 1 or 4 then this is a thin rhombus, otherwise it's fat.
-            if (s-r == 1 or s-r == 4):
-                color = htmlcolor_to_rgb(THIN_COLOR)
+    # the part of the plane covered by the surface, enlarged by the width of the edges.
+    left = offset[0] / scale - num_lines
+    top = offset[1] / scale - num_lines
+    viewport = (left - line_width, left + surface.get_width() / scale + line_width,
+                top - line_width, top + surface.get_height() / scale + line_width)
+    pairs, _, index, _ = visible_rhombi(grids, shifts, viewport)
+    graph = tiling_graph(grids, pairs, index)
+    points = graph['points']
+    painter = BatchPainter()
+    for t, color in enumerate(face_colors[:len(grids) // 2]):
+        painter.add_polygons(points[graph['faces'][graph['types'] == t]], fill=color)
+    # each edge is shared by two rhombi but it's stroked only once.
+    painter.add_segments(points[graph['edges']], stroke=edge_color, linewidth=line_width)
+    painter.draw(ctx)
+
+
+def render(filename, width=WIDTH, height=HEIGHT, num_lines=NUM_LINES,
+           band_size=None, processes=None):
+    """
+    Render the tiling to a png image. If `band_size` is given the image is cut
+    into horizontal bands of this height, they are drawn by `processes` worker
+    processes (None means all the cores) and written to the file as they are
+    finished, so posters larger than the memory can be rendered.
+    """
+    face_colors = [htmlcolor_to_rgb(c) for c in [THIN_COLOR, FAT_COLOR] + EXTRA_COLORS]
+    args = (GRIDS, SHIFTS, num_lines, face_colors, htmlcolor_to_rgb(EDGE_COLOR),
+            htmlcolor_to_rgb(BACKGROUND_COLOR), LINE_WIDTH)
+    if band_size is not None:
+        from tiledrender import render_tiles
+        render_tiles(draw_tiling, args, width, height, filename, (width, band_size), processes)
+        return
+
+    import cairocffi as cairo
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    draw_tiling(surface, (width, height), (0, 0), *args)
+    surface.write_to_png(filename)
+
+
+class ShiftSweep(object):
+    """
+    Follow the rhombi of a tiling while the shifts move along a path.
+
+    The rhombi are identified by their grids and lines (r, s, kr, ks), their
+    positions only depend on their index vectors. Let t_j = Re(z/GRIDS[j]) + SHIFTS[j]
+    for the intersection z, then index_j = ceil(t_j). When the shifts change by
+    dS, the intersection moves by an amount that is the same for all the rhombi
+    of the grids (r, s), so t_j changes by an amount d_j that only depends on
+    (r, s) and j. Hence the rhombi whose index vectors change are those whose
+    fractional parts of t_j lie in an interval of length |d_j|, they are found by
+    binary search in the fractional parts sorted once at the beginning, and only
+    these rhombi are recomputed.
+    """
+
+    def __init__(self, grids, path, viewport):
+        """
+        INPUTS:
+
+            - `grids`: the unit normals of the grids.
+
+            - `path`: an array of shape (frames, n), the shifts of the frames.
+              The lines are chosen so that the rhombi in `viewport` are
+              available for all of them, see `line_ranges`.
+
+            - `viewport`: (xmin, xmax, ymin, ymax) the part of the plane to follow.
+        """
+        self.grids = grids = np.asarray(grids)
+        path = np.asarray(path, dtype=float)
+        self.base = path[0]
+        self.shifts = path[0].copy()
+        self.pairs = list(itertools.combinations(range(len(grids)), 2))
+        kr, ks, members, frac = [], [], [], []
+        start = 0
+        for r, s in self.pairs:
+            ranges = [line_ranges(grids, shifts, r, s, viewport) for shifts in path]
+            lines = [np.arange(min(rg[k][0] for rg in ranges), max(rg[k][-1] for rg in ranges) + 1)
+                     for k in (0, 1)]
+            a, b = [x.ravel() for x in np.meshgrid(*lines, indexing='ij')]
+            z = intersections(grids, self.base, r, s, a, b)
+            t = (z[:, None] / grids).real + self.base
+            ids = np.arange(start, start + len(a))
+            start += len(a)
+            # for each grid j the rhombi sorted by the fractional parts of t_j.
+            order = np.argsort(t % 1, axis=0, kind='mergesort')
+            members.append(ids)
+            frac.append((ids[order], np.take_along_axis(t % 1, order, axis=0)))
+            kr.append(a)
+            ks.append(b)
+        self.kr, self.ks = np.concatenate(kr), np.concatenate(ks)
+        self.members, self.frac = members, frac
+        self.index = np.empty((start, len(grids)), dtype=np.int64)
+        self.vertices = np.empty((start, 4), dtype=complex)
+        self.types = np.empty(start, dtype=np.int64)
+        for (r, s), ids in zip(self.pairs, members):
+            self.index[ids], self.vertices[ids] = rhombi_of_pair(grids, self.base, r, s,
+                                                                 self.kr[ids], self.ks[ids])
+            self.types[ids] = rhombus_type(r, s, len(grids))
+
+    def offsets(self, r, s, shifts):
+        """The amounts d_j by which t_j of the rhombi of the grids (r, s) have moved."""
+        grids = self.grids
+        ds = shifts - self.base
+        dz = (grids[s] * ds[r] - grids[r] * ds[s]) * 1j / (grids[s] / grids[r]).imag
+        return (dz / grids).real + ds
+
+    def step(self, shifts, eps=1e-9):
+        """
+        Move to the new `shifts`, return the indices of the rhombi that changed
+        and their old vertices, the new vertices are in `self.vertices`.
+        """
+        shifts = np.asarray(shifts, dtype=float)
+        changed = []
+        for (r, s), ids, (order, frac) in zip(self.pairs, self.members, self.frac):
+            before, after = self.offsets(r, s, self.shifts), self.offsets(r, s, shifts)
+            candidates = []
+            for j in range(len(shifts)):
+                if j == r or j == s:
+                    continue
+                low, high = min(before[j], after[j]), max(before[j], after[j])
+                if high - low >= 1 - 2 * eps:
+                    candidates = [ids]
+                    break
+                # ceil(t_j) changes iff k - frac(t_j) is in [low, high) for an integer k.
+                first = np.searchsorted(frac[:, j], (-high - eps) % 1)
+                last = np.searchsorted(frac[:, j], (eps - low) % 1, side='right')
+                if first <= last:
+                    candidates.append(order[first:last, j])
+                else:
+                    candidates.extend([order[first:, j], order[:last, j]])
+            if not candidates:
+                continue
+            candidates = np.unique(np.concatenate(candidates))
+            index, vertices = rhombi_of_pair(self.grids, shifts, r, s,
+                                             self.kr[candidates], self.ks[candidates])
+            flipped = (index != self.index[candidates]).any(axis=1)
+            ids = candidates[flipped]
+            changed.append((ids, self.vertices[ids]))
+            self.index[ids], self.vertices[ids] = index[flipped], vertices[flipped]
+        self.shifts = shifts
+        if not changed:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=complex)
+        return tuple(np.concatenate(x) for x in zip(*changed))
+
+
+def paint_rhombi(canvas, box, quads, types, scale, num_lines, line_width):
+    """
+    Repaint the pixels canvas[y0:y1, x0:x1] of `box` = (x0, y0, x1, y1) with the
+    rhombi `quads` (an array of shape (m, 4) of vertices) in the palette indices
+    of `animate`: the background is 0, the edges are 1 and the faces of the type
+    t are 2 + t. The pixel (x, y) is at ((x + 0.5)/scale - num_lines, ...) in the
+    plane as in `draw_tiling`. Pixels are either in or out, so the frames only
+    differ where the tiling changes.
+    """
+    x0, y0, x1, y1 = box
+    canvas[y0:y1, x0:x1] = 0
+    quads = np.column_stack([quads.real.ravel(), quads.imag.ravel()]).reshape(-1, 4, 2)
+    pixels = (quads + num_lines) * scale
+    low = np.maximum(np.floor(pixels.min(axis=1) - scale * line_width).astype(int), [x0, y0])
+    high = np.minimum(np.ceil(pixels.max(axis=1) + scale * line_width).astype(int), [x1, y1])
+    patches = []
+    for quad, t, (a, b), (c, d) in zip(quads, types, low, high):
+        if a >= c or b >= d:
+            continue
+        y, x = np.mgrid[b:d, a:c]
+        point = np.stack([x + 0.5, y + 0.5], axis=-1) / scale - num_lines
+        sides = np.roll(quad, -1, axis=0) - quad
+        rel = point[..., None, :] - quad
+        cross = sides[:, 0] * rel[..., 1] - sides[:, 1] * rel[..., 0]
+        inside = (cross >= 0).all(axis=-1) | (cross <= 0).all(axis=-1)
+        canvas[b:d, a:c][inside] = 2 + t
+        # the distances to the four sides (the sides have unit length).
+        along = np.clip((rel * sides).sum(axis=-1), 0, 1)
+        dist = np.linalg.norm(rel - along[..., None] * sides, axis=-1).min(axis=-1)
+        patches.append((b, d, a, c, dist <= line_width / 2.0))
+    # the edges are painted after all the faces.
+    for b, d, a, c, edge in patches:
+        canvas[b:d, a:c][edge] = 1
+
+
+def animate(filename, path, width=WIDTH, height=HEIGHT, num_lines=NUM_LINES, delay=4):
+    """
+    Render the tilings of the shifts in `path` (an array of shape (frames, n))
+    to a gif animation. The first frame is drawn in full, then for each frame
+    only the rhombi that flipped are recomputed (see `ShiftSweep`), only the
+    pixels around them are repainted, and only the bounding box of the pixels
+    that changed is encoded, the unchanged pixels in it are transparent.
+    """
+    from encoder import GIFWriter
+    scale = max(width, height) / (2.0 * num_lines)
+    viewport = (-num_lines, width / scale - num_lines, -num_lines, height / scale - num_lines)
+    sweep = ShiftSweep(GRIDS, path, viewport)
+    # background, edges, the faces and a transparent color.
+    colors = [BACKGROUND_COLOR, EDGE_COLOR, THIN_COLOR, FAT_COLOR] + EXTRA_COLORS
+    min_bits = max(2, int(np.ceil(np.log2(len(colors) + 1))))
+    trans_index = (1 << min_bits) - 1
+    palette = [int(round(255 * c)) for color in colors for c in htmlcolor_to_rgb(color)]
+    writer = GIFWriter(width, height, min_bits, palette, 0)
+    margin = int(np.ceil(scale * LINE_WIDTH)) + 1
+
+    # a spatial index of the centers of the rhombi, the centers move when the rhombi
+    # flip, so the queries are enlarged by the largest move since the index is built.
+    state = {}
+
+    def build_index():
+        centers = sweep.vertices.mean(axis=1)
+        state['index'] = GridIndex(np.column_stack([centers.real, centers.imag]), 2)
+        state['centers'] = centers
+        state['drift'] = 0.0
+
+    def overlapping(x0, y0, x1, y1):
+        """The rhombi whose bounding boxes overlap the pixels of the box."""
+        low = np.array([x0 - margin, y0 - margin]) / scale - num_lines
+        high = np.array([x1 + margin, y1 + margin]) / scale - num_lines
+        # a rhombus lies within the distance 1 of its center.
+        radius = np.linalg.norm(high - low) / 2.0 + 1 + state['drift']
+        ids = state['index'].query_radius((low + high) / 2.0, radius)
+        pixels = (sweep.vertices[ids] + complex(num_lines, num_lines)) * scale
+        return ids[(pixels.real.max(axis=1) >= x0 - margin) & (pixels.real.min(axis=1) <= x1 + margin)
+                   & (pixels.imag.max(axis=1) >= y0 - margin) & (pixels.imag.min(axis=1) <= y1 + margin)]
+
+    build_index()
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    keep = overlapping(0, 0, width, height)
+    paint_rhombi(canvas, (0, 0, width, height), sweep.vertices[keep], sweep.types[keep],
+                 scale, num_lines, LINE_WIDTH)
+    previous = canvas.copy()
+
+    with open(filename, 'wb') as f:
+        f.write(writer.header())
+        f.write(writer.encode_frame(canvas, 0, 0, delay, trans_index))
+        for shifts in path[1:]:
+            changed, old = sweep.step(shifts)
+            if len(changed) > 0:
+                moved = np.abs(sweep.vertices[changed].mean(axis=1) - state['centers'][changed])
+                state['drift'] = max(state['drift'], moved.max())
+                if state['drift'] > 4:
+                    build_index()
+            boxes = []
+            for quad in np.concatenate([old, sweep.vertices[changed]], axis=1):
+                pixels = (quad + complex(num_lines, num_lines)) * scale
+                box = (int(np.floor(pixels.real.min())) - margin, int(np.floor(pixels.imag.min())) - margin,
+                       int(np.ceil(pixels.real.max())) + margin, int(np.ceil(pixels.imag.max())) + margin)
+                box = (max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height))
+                if box[0] < box[2] and box[1] < box[3]:
+                    boxes.append(box)
+            # repaint the boxes, the rhombi near a box are found with a vectorized test.
+            for box in boxes:
+                keep = overlapping(*box)
+                paint_rhombi(canvas, box, sweep.vertices[keep], sweep.types[keep],
+                             scale, num_lines, LINE_WIDTH)
+            if boxes:
+                x0, y0 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+                x1, y1 = max(b[2] for b in boxes), max(b[3] for b in boxes)
             else:
-                color = htmlcolor_to_rgb(FAT_COLOR)
+                x0, y0, x1, y1 = 0, 0, 1, 1
+            patch = canvas[y0:y1, x0:x1]
+            frame = np.where(patch != previous[y0:y1, x0:x1], patch, trans_index).astype(np.uint8)
+            previous[y0:y1, x0:x1] = patch
+            f.write(writer.encode_frame(frame, x0, y0, delay, trans_index))
+        f.write(writer.trailor)
 
-            ctx.set_source_rgb(*color)
-            A, B, C, D = compute_rhombus(r, s, kr, ks)
-            ctx.move_to(A.real, A.imag)
-            ctx.line_to(B.real, B.imag)
-            ctx.line_to(C.real, C.imag)
-            ctx.line_to(D.real, D.imag)
-            ctx.close_path()
-            ctx.fill_preserve()
 
-            ctx.set_source_rgb(*htmlcolor_to_rgb(EDGE_COLOR))
-            ctx.stroke()
+def sweep_path(shifts, frames, step, direction=None):
+    """
+    A straight path of `frames` shifts starting at `shifts` with the given `step`
+    size. The default direction is random with zero sum, so the sum of the shifts,
+    which decides the local rules of the tiling, stays the same.
+    """
+    if direction is None:
+        direction = np.random.randn(len(shifts))
+        direction -= direction.mean()
+    direction = direction / np.linalg.norm(direction)
+    return shifts + step * np.arange(frames)[:, None] * direction
+
 
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-width', type=int, default=WIDTH, help='image width')
+    parser.add_argument('-height', type=int, default=HEIGHT, help='image height')
+    parser.add_argument('-num_lines', type=float, default=NUM_LINES,
+                        help='the image shows [-num_lines, num_lines] of the plane along its longer side')
+    parser.add_argument('-filename', metavar='f', type=str, default='aperiodic_tiling.png',
+                        help='output filename')
+    parser.add_argument('-band_size', type=int, default=None,
+                        help='render in horizontal bands of this height in parallel')
+    parser.add_argument('-processes', type=int, default=None,
+                        help='number of worker processes for the bands, default to all the cores')
+    parser.add_argument('-export', metavar='e', type=str, default=None,
+                        help='save the graph of the tiling in the image to this npz file')
+    parser.add_argument('-animate', metavar='n', type=int, default=None,
+                        help='render a gif animation of n frames that sweeps the shifts')
+    parser.add_argument('-step', type=float, default=0.005,
+                        help='the change of the shifts between two frames of the animation')
+    parser.add_argument('-delay', type=int, default=4,
+                        help='delay between two frames of the animation in 1/100 seconds')
+    args = parser.parse_args(argv)
+    if args.animate is not None:
+        if args.export is not None or args.band_size is not None or args.processes is not None:
+            parser.error('-animate cannot be used with -export, -band_size or -processes')
+        path = sweep_path(SHIFTS, args.animate, args.step)
+        animate(args.filename, path, args.width, args.height, args.num_lines, args.delay)
+        return
+    render(args.filename, args.width, args.height, args.num_lines, args.band_size, args.processes)
+    if args.export is not None:
+        scale = max(args.width, args.height) / (2.0 * args.num_lines)
+        viewport = (-args.num_lines, args.width / scale - args.num_lines,
+                    -args.num_lines, args.height / scale - args.num_lines)
+        pairs, _, index, _ = visible_rhombi(GRIDS, SHIFTS, viewport)
+        save_graph(args.export, tiling_graph(GRIDS, pairs, index))
     print('shifts in the five directions:\n{}'.format(SHIFTS))
     print('thin color: {} fat color: {} edge color: {}'.format(THIN_COLOR, FAT_COLOR, EDGE_COLOR))
-    surface.write_to_png('aperiodic_tiling.png')
 
 
 if __name__ == '__main__':
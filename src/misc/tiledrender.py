@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Render a large picture in tiles on all the cores
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The image is cut into tiles (or horizontal bands), each tile is drawn by
+a worker process into its own cairo surface, and the main process copies
+the tiles of one row of tiles into a band of pixels and appends it to the
+png file. Only a few tiles are queued ahead of the writer, so only a few
+bands of the image are kept in memory no matter how large the picture is.
+
+A picture is described by a module level function (so that it can be sent
+to the workers) called as
+
+    draw(surface, size, offset, *args)
+
+where `size` is the (width, height) of the whole image and `offset` is the
+position of the top-left corner of the tile in it. The function must draw
+the part of the picture that falls in the surface, it's expected to skip
+everything outside the tile, see `modulargroup.draw_tiling`.
+
+Example:
+
+    render_tiles(modulargroup.draw_tiling, (20,), 16000, 8000, 'poster.png')
+"""
+
+import collections
+import itertools
+import struct
+import zlib
+from multiprocessing import Pool, cpu_count
+import numpy as np
+
+
+# A copy of `PNGWriter` in `domino/raster.py`, so that the scripts in this
+# directory do not depend on the other directories. Keep the two in sync.
+class PNGWriter(object):
+    """
+    Write an 8-bit RGB png image row by row. The compressed data is written
+    to the file as soon as zlib gives it out, so the whole image is never
+    kept in memory.
+    """
+
+    def __init__(self, f, width, height, level=6, chunk_size=1 << 20):
+        """
+        INPUTS:
+
+            - `f`: a writable binary file object.
+
+            - `width`, `height`: size of the image in pixels.
+
+            - `level`: compression level of zlib.
+
+            - `chunk_size`: the compressed data is written in IDAT chunks of about this size.
+        """
+        self.f = f
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(level)
+        self.buffer = bytearray()
+        f.write(b'\x89PNG\r\n\x1a\n')
+        self.write_chunk(b'IHDR', struct.pack('>2I5B', width, height, 8, 2, 0, 0, 0))
+
+    def write_chunk(self, tag, data):
+        self.f.write(struct.pack('>I', len(data)) + tag + data
+                     + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write_rows(self, rgb):
+        """Append an uint8 array of shape (rows, width, 3) to the image."""
+        rows = rgb.shape[0]
+        if rgb.shape[1:] != (self.width, 3) or self.rows + rows > self.height:
+            raise ValueError('The rows do not fit in the image!')
+        # each row begins with the filter type byte 0 (no filter).
+        data = np.zeros((rows, 3 * self.width + 1), dtype=np.uint8)
+        data[:, 1:] = rgb.reshape(rows, -1)
+        self.buffer += self.compressor.compress(data.tobytes())
+        self.rows += rows
+        while len(self.buffer) >= self.chunk_size:
+            self.write_chunk(b'IDAT', bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+
+    def close(self):
+        """Finish the image, all rows must have been written."""
+        if self.rows != self.height:
+            raise ValueError('Expect {} rows but got {}'.format(self.height, self.rows))
+        self.buffer += self.compressor.flush()
+        self.write_chunk(b'IDAT', bytes(self.buffer))
+        self.write_chunk(b'IEND', b'')
+        self.buffer = bytearray()
+
+
+def surface_to_rgb(surface):
+    """Return the pixels of a cairo RGB24 surface as an uint8 array of shape (height, width, 3)."""
+    surface.flush()
+    width, height = surface.get_width(), surface.get_height()
+    data = np.frombuffer(surface.get_data(), dtype=np.uint8)
+    data = data.reshape(height, surface.get_stride())[:, :4 * width].reshape(height, width, 4)
+    # a pixel is stored as a native-endian 32-bit integer 0xXXRRGGBB.
+    if np.little_endian:
+        return data[:, :, 2::-1].copy()
+    return data[:, :, 1:].copy()
+
+
+def render_tile(task):
+    """Draw one tile in a worker, return its pixels."""
+    import cairocffi as cairo
+    draw, args, size, offset, tile = task
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, *tile)
+    draw(surface, size, offset, *args)
+    return surface_to_rgb(surface)
+
+
+def _ordered_results(pool, tasks, window):
+    """Yield the tiles in order with at most `window` of them submitted ahead."""
+    tasks = iter(tasks)
+    pending = collections.deque(pool.apply_async(render_tile, (task,))
+                                for task in itertools.islice(tasks, window))
+    while pending:
+        result = pending.popleft().get()
+        for task in itertools.islice(tasks, 1):
+            pending.append(pool.apply_async(render_tile, (task,)))
+        yield result
+
+
+def render_tiles(draw, args, width, height, filename, tile_size=1024, processes=None, level=6):
+    """
+    Render a picture of size `width` x `height` to a png image in parallel.
+
+    INPUTS:
+
+        - `draw`, `args`: the picture, see the module docstring.
+
+        - `tile_size`: tiles are squares of this size, or rectangles of the size (width, height)
+          if it's a tuple, except at the right and bottom edges. Tiles of the size
+          (width, h) cut the image into horizontal bands.
+
+        - `processes`: number of worker processes, None means all the cores,
+          1 draws the tiles in the main process.
+
+        - `level`: compression level of zlib.
+    """
+    tile_width, tile_height = tile_size if isinstance(tile_size, tuple) else (tile_size, tile_size)
+    tasks = [(draw, args, (width, height), (x0, y0),
+              (min(tile_width, width - x0), min(tile_height, height - y0)))
+             for y0 in range(0, height, tile_height)
+             for x0 in range(0, width, tile_width)]
+
+    pool = None
+    if processes == 1:
+        results = (render_tile(task) for task in tasks)
+    else:
+        pool = Pool(processes)
+        results = _ordered_results(pool, tasks, 2 * (processes or cpu_count()) + 1)
+
+    try:
+        with open(filename, 'wb') as f:
+            writer = PNGWriter(f, width, height, level)
+            for y0 in range(0, height, tile_height):
+                band = np.empty((min(tile_height, height - y0), width, 3), dtype=np.uint8)
+                for x0 in range(0, width, tile_width):
+                    band[:, x0:x0 + tile_width] = next(results)
+                writer.write_rows(band)
+            writer.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
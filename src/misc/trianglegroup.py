@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Draw the hyperbolic tiling of the Poincare upper plane by the triangle
+group (p, q, r) using its shortlex word-acceptor automaton.
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The triangle group (p, q, r) is the Coxeter group with three generators
+a, b, c and the presentation
+
+    a^2 = b^2 = c^2 = (ab)^p = (bc)^q = (ca)^r = 1,
+
+it's generated by the reflections about the sides of a triangle with angles
+pi/p, pi/q, pi/r, which is hyperbolic if 1/p + 1/q + 1/r < 1.
+
+Like the modular group in `modulargroup.py` it's an automatic group, but
+here the automaton is built from the presentation instead of written by
+hand, following the method of Brink and Howlett as explained in
+
+    "Automata to perform basic calculations in Coxeter groups".
+                                                      W. Casselman.
+
+1. The group acts on R^3 by the reflections s(v) = v - 2B(v, e_s) e_s,
+   where B is the bilinear form B(e_s, e_t) = -cos(pi/m_st). The minimal
+   (or elementary) roots are the positive roots that do not dominate any
+   other root, there are only finitely many of them and they are obtained
+   from the simple roots by the rule: if b is minimal and -1 < B(b, e_s) < 0
+   then s(b) is minimal too.
+
+2. The states of the automaton are sets of minimal roots, the start state
+   is the empty set. Reading the symbol s from the state S is rejected if
+   e_s is in S, otherwise the next state is
+
+       ({e_s} U s(S) U {s(e_t): t < s}) intersected with the minimal roots.
+
+The words accepted are exactly the shortlex normal forms of the elements.
+Since the construction relies on floating point arithmetic it's checked
+against a brute-force enumeration of the group (by matrices) for all words
+up to a small length, and the result is cached on disk in the directory
+`triangle_cache`, one json file per presentation.
+
+The elements are then traversed by `traverse_group` in `modulargroup.py`
+and drawn with its `HyperbolicDrawing`, the elements whose descendants
+are outside the picture or smaller than a pixel are culled by its
+`wall_culler`.
+
+Usage:
+
+    python trianglegroup.py -pqr 2 3 7 -length 30 -filename triangle_237.png
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+from modulargroup import HyperbolicDrawing, traverse_group, tile_viewport, wall_culler, XLIM, YLIM
+
+
+CACHE_DIR = 'triangle_cache'
+
+SYMBOLS = 'abc'
+
+
+def coxeter_matrix(p, q, r):
+    """The orders m_st of the products of the generators a, b, c."""
+    return np.array([[1, p, r],
+                     [p, 1, q],
+                     [r, q, 1]])
+
+
+def bilinear_form(p, q, r):
+    """The matrix of the form B(e_s, e_t) = -cos(pi/m_st) on the simple roots."""
+    return -np.cos(np.pi / coxeter_matrix(p, q, r))
+
+
+def is_hyperbolic(p, q, r):
+    return p * q + q * r + r * p < p * q * r
+
+
+def minimal_roots(form, decimals=8):
+    """
+    Return the minimal roots as an array of their coordinates in the simple
+    roots (listed by rows, the simple roots come first) and a dict that maps
+    the rounded coordinates of a minimal root to its index.
+    """
+    roots = list(np.eye(len(form)))
+    index = {tuple(np.round(root, decimals)): k for k, root in enumerate(roots)}
+    for root in roots:  # `roots` grows while it's iterated.
+        for s, b in enumerate(np.dot(root, form)):
+            if -1 + 1e-9 < b < -1e-9:
+                image = root.copy()
+                image[s] -= 2 * b
+                key = tuple(np.round(image, decimals))
+                if key not in index:
+                    index[key] = len(roots)
+                    roots.append(image)
+    return np.array(roots), index
+
+
+def build_automaton(p, q, r, decimals=8):
+    """
+    Return the shortlex automaton of the triangle group (p, q, r) as a dict
+    in the form of `modulargroup.automaton` with the symbols 'a', 'b', 'c'.
+    The states are numbered in the order they are found, 0 is the start state.
+    """
+    form = bilinear_form(p, q, r)
+    roots, index = minimal_roots(form, decimals)
+
+    def reflect(k, s):
+        """The index of the minimal root s(roots[k]), or None if it's not minimal."""
+        image = roots[k].copy()
+        image[s] -= 2 * np.dot(image, form[:, s])
+        return index.get(tuple(np.round(image, decimals)))
+
+    start = frozenset()
+    numbers = {start: 0}
+    sets = [start]
+    result = {}
+    for state in sets:  # `sets` grows while it's iterated.
+        result[numbers[state]] = {}
+        for s, symbol in enumerate(SYMBOLS):
+            if s in state:
+                continue
+            target = {s}
+            target.update(reflect(k, s) for k in state)
+            target.update(reflect(t, s) for t in range(s))
+            target = frozenset(target - {None})
+            if target not in numbers:
+                numbers[target] = len(sets)
+                sets.append(target)
+            result[numbers[state]][symbol] = numbers[target]
+    return result
+
+
+def accepted_words(dfa, length):
+    """Return the list of words of length at most `length` accepted by `dfa`."""
+    words, level = [''], [('', 0)]
+    for _ in range(length):
+        level = [(word + symbol, to) for word, state in level
+                 for symbol, to in sorted(dfa[state].items())]
+        words.extend(word for word, _ in level)
+    return words
+
+
+def normal_forms(p, q, r, length, decimals=6):
+    """
+    Return the list of shortlex normal forms of length at most `length` by
+    brute force: the words are enumerated in the shortlex order and a word is
+    kept if the matrix of its element (in the action on the simple roots)
+    has not been seen before. Only the kept words are extended since a prefix
+    of a normal form is a normal form.
+    """
+    form = bilinear_form(p, q, r)
+    generators = [np.eye(3) - 2 * np.outer(np.eye(3)[s], form[s]) for s in range(3)]
+    seen = {tuple(np.round(np.eye(3), decimals).ravel())}
+    words, level = [''], [('', np.eye(3))]
+    for _ in range(length):
+        children = []
+        for word, matrix in level:
+            for s, symbol in enumerate(SYMBOLS):
+                product = np.dot(matrix, generators[s])
+                key = tuple(np.round(product, decimals).ravel())
+                if key not in seen:
+                    seen.add(key)
+                    children.append((word + symbol, product))
+        level = children
+        words.extend(word for word, _ in level)
+    return words
+
+
+def verify(dfa, p, q, r, length):
+    """Raise ValueError if `dfa` disagrees with the brute force up to `length`."""
+    if sorted(accepted_words(dfa, length)) != sorted(normal_forms(p, q, r, length)):
+        raise ValueError('The automaton of the triangle group ({}, {}, {}) is wrong '
+                         'for the words of length at most {}'.format(p, q, r, length))
+
+
+def load_or_compute(p, q, r, cache_dir=CACHE_DIR, verify_length=10):
+    """
+    The same as `build_automaton` but the result is verified up to `verify_length`
+    and cached on disk when it's computed for the first time, None disables the cache.
+    """
+    if cache_dir is not None:
+        filename = os.path.join(cache_dir, '{}_{}_{}.json'.format(p, q, r))
+        if os.path.exists(filename):
+            with open(filename) as f:
+                return {int(state): arrows for state, arrows in json.load(f).items()}
+
+    dfa = build_automaton(p, q, r)
+    verify(dfa, p, q, r, verify_length)
+    if cache_dir is not None:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(filename, 'w') as f:
+            json.dump(dfa, f, sort_keys=True)
+    return dfa
+
+
+def mirror_normals(p, q, r):
+    """
+    Return the unit normals n_a, n_b, n_c (listed by rows) of the three mirrors in
+    R^{2,1} with the Lorentz form x^2 + y^2 - t^2, their inner products are the
+    bilinear form B. The normals are read off from the eigen-decomposition of B.
+    """
+    eigenvals, eigenvecs = np.linalg.eigh(bilinear_form(p, q, r))
+    if not (eigenvals[0] < 0 < eigenvals[1]):
+        raise ValueError('The triangle group ({}, {}, {}) is not hyperbolic'.format(p, q, r))
+    # move the negative eigenvalue to the last coordinate t.
+    return (eigenvecs * np.sqrt(np.abs(eigenvals)))[:, [1, 2, 0]]
+
+
+def to_upper_plane(v):
+    """
+    Map a time-like vector (x, y, t) in R^{2,1} to a point in the upper plane.
+    The geodesic orthogonal to a space-like vector n = (u, v, w) is the circle
+    A|z|^2 + Bx + C = 0 with A = w + v, B = 2u, C = w - v, this pairing matches
+    the vector v with (|z|^2, x, 1) up to a scalar.
+    """
+    x, y, t = v
+    modulus, real, one = (y - t) / 2.0, x / 2.0, -(y + t) / 2.0
+    real, modulus = real / one, modulus / one
+    return complex(real, np.sqrt(modulus - real**2))
+
+
+def reflection_matrix(n):
+    """
+    The reflection about the geodesic orthogonal to a unit space-like vector n,
+    it's the anti-Mobius map z -> (a conj(z) + b) / (c conj(z) + d), return its
+    real matrix ((a, b), (c, d)) of determinant -1.
+    """
+    u, v, w = n
+    A, B, C = w + v, 2 * u, w - v
+    return np.array([[-B / 2.0, -C], [A, B / 2.0]])
+
+
+def fundamental_domain(p, q, r):
+    """
+    Return the matrices of the three reflections and the vertices of the triangle
+    bounded by their mirrors. The picture is moved so that the incenter of the
+    triangle is the point i. The vertex opposite to a mirror is listed at its position.
+    """
+    normals = mirror_normals(p, q, r)
+    lorentz = np.diag([1, 1, -1])
+    # the incenter has the same distance to the three mirrors.
+    center = to_upper_plane(np.linalg.solve(np.dot(normals, lorentz), -np.ones(3)))
+    # the affine map z -> (z - Re(center)) / Im(center) takes the incenter to i.
+    move = np.array([[1, -center.real], [0, center.imag]])
+    move_inv = np.linalg.inv(move)
+    reflections = [np.dot(np.dot(move, reflection_matrix(n)), move_inv) for n in normals]
+    vertices = []
+    for i in range(3):
+        j, k = [x for x in range(3) if x != i]
+        z = to_upper_plane(np.dot(lorentz, np.cross(normals[j], normals[k])))
+        vertices.append((z - center.real) / center.imag)
+    return np.array(reflections), tuple(vertices)
+
+
+def traverse(p, q, r, length, cull=None, cache_dir=CACHE_DIR):
+    """Yield the same tuples as `modulargroup.traverse_levels` for the triangle group."""
+    dfa = load_or_compute(p, q, r, cache_dir)
+    generators, domain = fundamental_domain(p, q, r)
+    return traverse_group(length, dfa, SYMBOLS, generators, domain,
+                          cull, reflections=[True] * 3)
+
+
+def draw_tiling(surface, size, offset, p, q, r, length, cull=True, cache_dir=CACHE_DIR):
+    """
+    Draw the domains g(D) for the words g of length at most `length` to `surface`,
+    which is the tile with its top-left corner at `offset` of the picture of `size`
+    pixels, see `modulargroup.draw_tiling`. The domains of the even and odd elements
+    are in two colors.
+    """
+    ctx = HyperbolicDrawing(surface)
+    ctx.set_axis(xlim=XLIM, ylim=YLIM, size=size, offset=offset, background_color=(1, 1, 1))
+    ctx.set_line_join(2)
+
+    if cull:
+        tile = (surface.get_width(), surface.get_height())
+        xlim, ylim = tile_viewport(XLIM, YLIM, size, offset, tile, pad=0.01)
+        cull = wall_culler(xlim, ylim, float(XLIM[1] - XLIM[0]) / size[0])
+    else:
+        cull = None
+    for level, states, last, matrices, points, infinite in traverse(p, q, r, length, cull, cache_dir):
+        fc_color = (1, 0.5, 0.75) if level % 2 else (0.5, 0.5, 0.5)
+        for triangle in points:
+            ctx.render_domain(list(triangle), facecolor=fc_color, linewidth=0.02/(level+1))
+
+
+def render(p, q, r, length=30, width=800, height=400, filename='trianglegroup.png',
+           cull=True, cache_dir=CACHE_DIR, tile_size=None, processes=None):
+    """
+    Draw the domains g(D) for the words g of length at most `length` to a png image.
+    If `cull` is True then the domains smaller than a pixel or outside the image are
+    skipped. `tile_size` and `processes` are the same as in `modulargroup.render`.
+    """
+    # build the automaton before the workers need it.
+    load_or_compute(p, q, r, cache_dir)
+    if tile_size is not None:
+        from tiledrender import render_tiles
+        render_tiles(draw_tiling, (p, q, r, length, cull, cache_dir),
+                     width, height, filename, tile_size, processes)
+        return
+
+    import cairocffi as cairo
+    surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+    draw_tiling(surface, (width, height), (0, 0), p, q, r, length, cull, cache_dir)
+    surface.write_to_png(filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-pqr', metavar='m', type=int, nargs=3, default=[2, 3, 7],
+                        help='the orders p, q, r of the products ab, bc, ca')
+    parser.add_argument('-length', metavar='l', type=int, default=30,
+                        help='max length of the words')
+    parser.add_argument('-width', type=int, default=800, help='image width')
+    parser.add_argument('-height', type=int, default=400, help='image height')
+    parser.add_argument('-filename', metavar='f', type=str, default='trianglegroup.png',
+                        help='output filename')
+    parser.add_argument('-cache_dir', metavar='c', type=str, default=CACHE_DIR,
+                        help='directory of the cached automata')
+    parser.add_argument('-tile_size', type=int, default=None,
+                        help='render in tiles of this size in parallel')
+    parser.add_argument('-processes', type=int, default=None,
+                        help='number of worker processes for the tiles, default to all the cores')
+    args = parser.parse_args(argv)
+    p, q, r = args.pqr
+    if not is_hyperbolic(p, q, r):
+        raise ValueError('The triangle group ({}, {}, {}) is not hyperbolic'.format(p, q, r))
+    render(p, q, r, args.length, args.width, args.height, args.filename,
+           cache_dir=args.cache_dir, tile_size=args.tile_size, processes=args.processes)
+
+
+if __name__ == '__main__':
+    main()
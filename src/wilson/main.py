@@ -8,7 +8,8 @@ and maze solving algorithms
 Usage:
       python main.py [-width] [-height] [-scale]
                      [-margin] [-bits]
-                     [-loop] [-filename]
+                     [-loop] [-seed] [-solvers]
+                     [-filename]
 Optional arguments:
     width, height: size of the maze (not the image), should both be odd integers.
     scale: the size of the image will be (width * scale) * (height * scale).
@@ -18,51 +19,61 @@ Optional arguments:
     bits: number of bits needed to represent all colors.
           This value determines the number of colors used in the image.
     loop: number of loops of the image, default to 0 (loop infinitely).
+    seed: seed for the random number generator.
+    solvers: maze solving algorithms, any of 'bfs', 'dfs' and 'astar'.
+             If more than one is given then the maze is generated only once
+             and each solver writes its own animation in a separate process,
+             e.g. `-solvers bfs astar` outputs wilson_bfs.gif and wilson_astar.gif.
     filename: the output file.
 
 Copyright (c) 2016 by Zhao Liang.
 """
+import io
+import os
 import argparse
+import random
+import multiprocessing
 from colorsys import hls_to_rgb
 from maze import Maze
 from algorithms import (prim, random_dfs, kruskal, wilson, bfs, dfs, astar)
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-width', type=int, default=121,
-                        help='width of the maze')
-    parser.add_argument('-height', type=int, default=97,
-                        help='height of the maze')
-    parser.add_argument('-margin', type=int, default=2,
-                        help='border of the maze')
-    parser.add_argument('-scale', type=int, default=5,
-                        help='size of a cell in pixels')
-    parser.add_argument('-loop', type=int, default=0,
-                        help='number of loops of the animation, default to 0 (loop infinitely)')
-    parser.add_argument('-bits', metavar='b', type=int, default=8,
-                        help='an interger beteween 2-8 represents the color depth of the image,\
-                        this parameter determines the size of the global color table.')
-    parser.add_argument('-filename', type=str, default='wilson.gif',
-                        help='output file name')
-    args = parser.parse_args()
-
+def make_palette():
+    """Return the global color table used by the animations."""
     # define your favorite global color table here.
-    mypalette = [0, 0, 0, 200, 200, 200, 255, 0, 255]    
+    mypalette = [0, 0, 0, 200, 200, 200, 255, 0, 255]
     # GIF files allows at most 256 colors in the global color table,
     # redundant colors will be discarded when the encoder is initialized.
     for i in range(256):
         rgb = hls_to_rgb((i / 360.0) % 1, 0.5, 1.0)
         mypalette += map(lambda x: int(round(255 * x)), rgb)
+    return mypalette
+
+
+SOLVERS = {'bfs': bfs, 'dfs': dfs, 'astar': astar}
+
+
+def make_maze(target, width, height, margin, scale, bits, loop, text, seed):
+    """Create a maze with a canvas that writes into `target`."""
+    if seed is not None:
+        random.seed(seed)
 
     # you may use a binary image instance of PIL's Image class here as the mask image,
     # this image must preserve the connectivity of the grid graph.
-    from gentext import generate_text_mask
-    mask = generate_text_mask(args.width, args.height, 'UST', '../../resources/ubuntu.ttf', 60)
-    maze = Maze(args.width, args.height, args.margin, mask=mask)
-    canvas = maze.add_canvas(scale=args.scale, min_bits=args.bits, palette=mypalette,
-                             loop=args.loop, filename=args.filename)
-
+    if text:
+        from gentext import generate_text_mask
+        mask = generate_text_mask(width, height, text, '../../resources/ubuntu.ttf', 60)
+    else:
+        mask = None
+    maze = Maze(width, height, margin, mask=mask)
+    maze.add_canvas(scale=scale, min_bits=bits, palette=make_palette(),
+                    loop=loop, filename=target)
+    return maze
+
+
+def run_generation(maze, start):
+    """The maze generation part of the animation."""
+    canvas = maze.canvas
     # here we need to paint the blank background because the region that has not been
     # covered by any frame will be set to transparent by decoders.
     # Comment out this line and watch the result if you don't understand this.
@@ -75,9 +86,6 @@ def main():
     canvas.set_control_params(delay=2, speed=50, trans_index=3,
                               wall_color=0, tree_color=1, path_color=2)
 
-    start = (args.margin, args.margin)
-    end = (args.width - args.margin - 1, args.height - args.margin - 1)
-
     # the maze generation animation.
     # try prim(maze, start) or kruskal(maze) or random_dfs(maze) here!
     wilson(maze, start)
@@ -85,14 +93,17 @@ def main():
     # pad three seconds delay to help to see the resulting maze clearly.
     canvas.pad_delay_frame(delay=300)
 
+
+def run_solving(maze, solver, start, end):
+    """The maze solving part of the animation, `solver` is a key of `SOLVERS`."""
+    canvas = maze.canvas
     # in the path finding animation the walls are unchanged throughout,
     # hence it's safe to use color 0 as the transparent color.
     canvas.set_control_params(delay=5, speed=30, trans_index=0, wall_color=0,
                               tree_color=0, path_color=2, fill_color=3)
 
     # the maze solving animation.
-    # try dfs(maze, start, end) or astar(maze, start, end) here!
-    bfs(maze, start, end)
+    SOLVERS[solver](maze, start, end)
 
     # pad five seconds delay to help to see the resulting path clearly.
     canvas.pad_delay_frame(delay=500)
@@ -101,5 +112,110 @@ def main():
     canvas.save()
 
 
+def make_animation(target, width=121, height=97, margin=2, scale=5,
+                   bits=8, loop=0, text='UST', seed=None, solver='bfs'):
+    """
+    Run Wilson's algorithm and then solve the maze with `solver`,
+    write the whole animation into `target`.
+
+    INPUTS:
+
+        - `target`: output filename or a writable binary file object,
+                    it will be closed when the animation is finished.
+
+        - `text`: the text embedded in the mask image, an empty string means no mask.
+
+        - `seed`: seed for the random number generator, the same parameters
+                  with the same seed always give the same animation.
+
+        - `solver`: one of 'bfs', 'dfs' and 'astar'.
+
+    The other parameters are explained in the docstring of this script.
+    """
+    maze = make_maze(target, width, height, margin, scale, bits, loop, text, seed)
+    start = (margin, margin)
+    end = (width - margin - 1, height - margin - 1)
+    run_generation(maze, start)
+    run_solving(maze, solver, start, end)
+
+
+def solve_from_snapshot(maze, prefix, solver, filename, start, end):
+    """
+    Write the bytes of the generation animation and then continue
+    with the solving animation, this runs in a child process.
+    """
+    maze.canvas.target_file = open(filename, 'wb')
+    maze.canvas.target_file.write(prefix)
+    run_solving(maze, solver, start, end)
+
+
+def make_solver_animations(targets, width=121, height=97, margin=2, scale=5,
+                           bits=8, loop=0, text='UST', seed=None):
+    """
+    Generate one maze and solve it with several algorithms in parallel.
+
+    The generation animation is encoded only once into memory. Then one
+    process is forked for each solver, it starts from a copy of the
+    generated maze and writes the shared generation bytes followed by
+    its own solving animation, so all animations are finished in the
+    time of the slowest solver.
+
+    INPUTS:
+
+        - `targets`: a dict {solver: filename}, solvers must be keys of `SOLVERS`.
+
+    The other parameters are the same with those in `make_animation`.
+    """
+    maze = make_maze(io.BytesIO(), width, height, margin, scale, bits, loop, text, seed)
+    start = (margin, margin)
+    end = (width - margin - 1, height - margin - 1)
+    run_generation(maze, start)
+    prefix = maze.canvas.target_file.getvalue()
+
+    workers = [multiprocessing.Process(target=solve_from_snapshot,
+                                       args=(maze, prefix, solver, filename, start, end))
+               for solver, filename in targets.items()]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+        if p.exitcode != 0:
+            raise RuntimeError('A solver process exited with code {}'.format(p.exitcode))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-width', type=int, default=121,
+                        help='width of the maze')
+    parser.add_argument('-height', type=int, default=97,
+                        help='height of the maze')
+    parser.add_argument('-margin', type=int, default=2,
+                        help='border of the maze')
+    parser.add_argument('-scale', type=int, default=5,
+                        help='size of a cell in pixels')
+    parser.add_argument('-loop', type=int, default=0,
+                        help='number of loops of the animation, default to 0 (loop infinitely)')
+    parser.add_argument('-bits', metavar='b', type=int, default=8,
+                        help='an interger beteween 2-8 represents the color depth of the image,\
+                        this parameter determines the size of the global color table.')
+    parser.add_argument('-seed', type=int, default=None,
+                        help='seed for the random number generator')
+    parser.add_argument('-solvers', nargs='+', default=['bfs'], choices=sorted(SOLVERS),
+                        help='maze solving algorithms, if more than one is given then\
+                        each of them is rendered into its own file in parallel')
+    parser.add_argument('-filename', type=str, default='wilson.gif',
+                        help='output file name')
+    args = parser.parse_args()
+
+    if len(args.solvers) == 1:
+        make_animation(args.filename, args.width, args.height, args.margin, args.scale,
+                       args.bits, args.loop, seed=args.seed, solver=args.solvers[0])
+    else:
+        root, ext = os.path.splitext(args.filename)
+        targets = {solver: '{}_{}{}'.format(root, solver, ext) for solver in args.solvers}
+        make_solver_animations(targets, args.width, args.height, args.margin, args.scale,
+                               args.bits, args.loop, seed=args.seed)
+
+
 if __name__ == '__main__':
     main()
@@ -26,7 +26,7 @@ class Canvas(object):
 
             - `scale`: each cell in the maze occupies scale*scale pixels in the image.
 
-            - `filename`: the output file.
+            - `filename`: the output file, either a path or a writable binary file object.
 
             - `min_bits`, `palette`, `loop`: the same as they are in the GIFWriter class.
         """
@@ -38,7 +38,10 @@ class Canvas(object):
         self.speed = 10        # output the frame once this number of cells are changed.
         self.trans_index = 3   # the index of the transparent color in the global color table.
         self.delay = 5         # delay between successive frames.
-        self.target_file = open(filename, 'wb')
+        if hasattr(filename, 'write'):
+            self.target_file = filename
+        else:
+            self.target_file = open(filename, 'wb')
         self.target_file.write(self.writer.logical_screen_descriptor
                                + self.writer.global_color_table
                                + self.writer.loop_control)
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+A local HTTP server for rendering maze animations
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Usage:
+      python server.py [-port] [-workers] [-cache_dir] [-cache_size]
+
+Then request an animation with a url like
+
+    http://localhost:8000/maze.gif?width=121&height=97&scale=5&seed=42
+
+Accepted query parameters are `width`, `height`, `margin`, `scale`,
+`bits`, `loop`, `text` and `seed`, their meanings are the same as in
+`main.py`. `text` defaults to an empty string (no mask image) and
+`seed` defaults to 0, so a url always gives the same animation.
+
+The animations are rendered by a pool of worker processes, so the
+server does not pay for the interpreter startup each time. The GIF
+bytes are streamed back to the client as the frames are encoded, and
+finished files are kept in an on-disk cache keyed by the parameters.
+The cache is bounded by `cache_size` (in megabytes), the least recently
+used files are evicted first.
+
+Copyright (c) 2016 by Zhao Liang.
+"""
+import os
+import time
+import socket
+import hashlib
+import argparse
+import threading
+import multiprocessing
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+from main import make_animation
+
+
+# name of the parameter: (type, default value, min value, max value).
+PARAMS = {'width': (int, 121, 5, 2001),
+          'height': (int, 97, 5, 2001),
+          'margin': (int, 2, 0, 100),
+          'scale': (int, 5, 1, 20),
+          'bits': (int, 8, 2, 8),
+          'loop': (int, 0, 0, 65535),
+          'seed': (int, 0, None, None),
+          'text': (str, '', None, None)}
+
+CHUNK_SIZE = 1 << 16
+
+
+def parse_params(query):
+    """
+    Parse the query string of a request into a dict of maze parameters.
+    Raise ValueError if any of the parameters is invalid.
+    """
+    fields = parse_qs(query)
+    params = {}
+    for key, (tp, default, low, high) in PARAMS.items():
+        val = tp(fields[key][0]) if key in fields else default
+        if (low is not None and val < low) or (high is not None and val > high):
+            raise ValueError('{} must lie between {} and {}'.format(key, low, high))
+        params[key] = val
+
+    if params['width'] * params['height'] % 2 == 0:
+        raise ValueError('The width and height of the maze must both be odd integers!')
+    return params
+
+
+def cache_key(params):
+    """A key that identifies the animation given by these parameters."""
+    items = ','.join('{}={}'.format(key, params[key]) for key in sorted(params))
+    return hashlib.sha1(items.encode('utf-8')).hexdigest()
+
+
+def render_job(params, filename):
+    """Render the animation into `filename`, this runs in a worker process."""
+    with open(filename, 'wb') as f:
+        make_animation(f, **params)
+
+
+class MazeCache(object):
+    """
+    A size-bounded on-disk cache of the rendered animations.
+    A file `key.gif` is a finished animation, `key.gif.part` is an animation
+    that is being rendered by a worker process.
+    """
+
+    def __init__(self, cache_dir, max_bytes, workers):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pool = multiprocessing.Pool(workers)
+        self.lock = threading.RLock()
+        self.jobs = {}  # the animations that are being rendered: {key: async result}.
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # remove the partial files left by a previous server.
+        for f in os.listdir(cache_dir):
+            if f.endswith('.part'):
+                os.remove(os.path.join(cache_dir, f))
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.gif')
+
+    def open(self, filename):
+        """
+        Open a finished animation and mark it as recently used, return None if it's not
+        in the cache. The file is opened under the lock so `evict` can not remove it first.
+        """
+        with self.lock:
+            try:
+                f = open(filename, 'rb')
+            except IOError:
+                return None
+            os.utime(filename, None)
+            return f
+
+    def lookup(self, params):
+        """
+        Return a tuple (f, job). If the animation is cached then `job` is None and `f`
+        is the opened file, otherwise `f` is the name of the partial file that is being
+        written by `job`.
+        """
+        key = cache_key(params)
+        filename = self.path(key)
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                f = self.open(filename)
+                if f is not None:
+                    return f, None
+                job = self.pool.apply_async(render_job, (params, filename + '.part'))
+                self.jobs[key] = job
+        return filename + '.part', job
+
+    def finish(self, params):
+        """Move a finished animation into the cache and evict old files."""
+        key = cache_key(params)
+        filename = self.path(key)
+        with self.lock:
+            job = self.jobs.get(key)
+        if job is None:
+            return
+        # a client may leave before the worker is done, wait outside the lock.
+        job.wait()
+        with self.lock:
+            if self.jobs.pop(key, None) is not job:
+                return  # another request has finished it.
+            if job.successful():
+                os.rename(filename + '.part', filename)
+            elif os.path.exists(filename + '.part'):
+                os.remove(filename + '.part')
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used animations until the cache fits in `max_bytes`."""
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                 if f.endswith('.gif')]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(f) for f in files)
+        while files and total > self.max_bytes:
+            f = files.pop(0)
+            total -= os.path.getsize(f)
+            os.remove(f)
+
+
+class MazeRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/maze.gif':
+            self.send_error(404)
+            return
+        try:
+            params = parse_params(url.query)
+        except ValueError as err:
+            self.send_error(400, str(err))
+            return
+
+        while True:
+            f, job = self.server.cache.lookup(params)
+            if job is None:
+                self.send_cached(f)
+                return
+            if self.send_streaming(f, job, params):
+                return
+
+    def send_cached(self, f):
+        with f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_streaming(self, filename, job, params):
+        """
+        Send the partial file with chunked encoding while the worker is writing it.
+        Return False if the animation is finished and already evicted from the cache.
+        """
+        # wait for the worker to create the file.
+        while not os.path.exists(filename) and not job.ready():
+            time.sleep(0.01)
+
+        if job.ready() and not job.successful():
+            self.server.cache.finish(params)
+            self.send_error(500, 'Failed to render the maze')
+            return True
+
+        try:
+            f = open(filename, 'rb')
+        except IOError:
+            # another request has already moved the finished file into the cache.
+            f = self.server.cache.open(filename[:-len('.part')])
+            if f is None:
+                return False
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        try:
+            with f:
+                while True:
+                    # check the status before reading so that nothing is missed at the end.
+                    done = job.ready()
+                    data = f.read(CHUNK_SIZE)
+                    if data:
+                        self.wfile.write('{:X}\r\n'.format(len(data)).encode('ascii') + data + b'\r\n')
+                    elif done:
+                        break
+                    else:
+                        time.sleep(0.01)
+            if job.successful():
+                self.wfile.write(b'0\r\n\r\n')
+            else:
+                # close without the last chunk so that the client sees a broken transfer.
+                self.close_connection = True
+        except socket.error:
+            # the client has gone away, the worker still finishes the animation for the cache.
+            self.close_connection = True
+        finally:
+            self.server.cache.finish(params)
+        return True
+
+
+class MazeServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address, cache):
+        HTTPServer.__init__(self, address, MazeRequestHandler)
+        self.cache = cache
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-port', type=int, default=8000,
+                        help='port of the server')
+    parser.add_argument('-workers', type=int, default=multiprocessing.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('-cache_dir', type=str, default='maze_cache',
+                        help='directory of the cached animations')
+    parser.add_argument('-cache_size', type=int, default=500,
+                        help='max size of the cache in megabytes')
+    args = parser.parse_args()
+
+    cache = MazeCache(args.cache_dir, args.cache_size << 20, args.workers)
+    server = MazeServer(('localhost', args.port), cache)
+    print('serving on http://localhost:{}/maze.gif'.format(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        cache.pool.terminate()
+
+
+if __name__ == '__main__':
+    main()